@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def compute_fft(signal, sample_rate, max_freq=4000):
+    n_samples = signal.shape[-1]
+    fft_result = np.fft.rfft(signal)
+    fft_freq = np.fft.rfftfreq(n_samples, 1/sample_rate)
+    fft_magnitude = np.abs(fft_result) / n_samples * 2  
+    
+    max_freq_idx = np.where(fft_freq <= max_freq)[0][-1] + 1
+    return fft_freq[:max_freq_idx], fft_magnitude[..., :max_freq_idx]
+
+
+class SpectrumAnalyzer:
+    """Rolling short-time spectrum of the audio being played.
+
+    The audio callback calls push(), which only copies the block into a
+    preallocated ring buffer: it never blocks and never allocates sample
+    memory. The UI calls get_spectrum() at its own frame rate, independent
+    of the audio block size, to transform the latest fft_size samples with
+    a precomputed window and frequency axis.
+    """
+    
+    def __init__(self, sample_rate, channels=1, fft_size=4096, max_freq=4000, ring_size=None):
+        if ring_size is None:
+            ring_size = 4 * fft_size
+        
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.window = np.hanning(fft_size)
+        # Amplitude scaling matching compute_fft for a windowed frame
+        self.scale = 2.0 / np.sum(self.window)
+        
+        freqs = np.fft.rfftfreq(fft_size, 1.0 / sample_rate)
+        self.num_bins = np.searchsorted(freqs, max_freq, side='right')
+        self.freqs = freqs[:self.num_bins]
+        
+        self._ring = np.zeros((ring_size, channels), dtype=np.float32)
+        self._offsets = np.arange(-fft_size, 0)
+        self.samples_written = 0
+    
+    def push(self, block):
+        ring_size = len(self._ring)
+        count = len(block)
+        if count > ring_size:
+            block = block[count - ring_size:]
+            self.samples_written += count - ring_size
+            count = ring_size
+        
+        pos = self.samples_written % ring_size
+        first = min(count, ring_size - pos)
+        self._ring[pos:pos + first] = block[:first]
+        self._ring[:count - first] = block[first:]
+        self.samples_written += count
+    
+    def get_spectrum(self):
+        end = self.samples_written
+        frame = self._ring.take((end + self._offsets) % len(self._ring), axis=0)
+        frame = frame.mean(axis=1) * self.window
+        return self.freqs, np.abs(np.fft.rfft(frame)[:self.num_bins]) * self.scale
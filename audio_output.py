@@ -0,0 +1,269 @@
+import threading
+import time
+
+import numpy as np
+
+from filters import StreamingEqualizer
+from instrumentation import STATUS_FLAGS
+from wav_io import WavWriter
+
+# Callback return flags, same values as pyaudio.paContinue / paComplete
+CONTINUE = 0
+COMPLETE = 1
+
+
+class EqualizedPlayback:
+    """Audio callback streaming a source through the equalizer bank.
+
+    read_block(pos, frame_count) returns a (channels x samples) block of
+    the source. Each callback filters one block and mixes it with
+    mix_weights, which the UI thread swaps for a new array on every
+    band/gain change; the callback reads the reference once per block, so
+    no lock is needed. The callback completes once num_samples have been
+    played or is_running() turns false, calling on_finished in the first
+    case. The signature is PortAudio's, so any sink below can drive it.
+    With a ParametricEqualizer the weights go into its biquads instead of
+    mixing a filter bank.
+    """
+
+    def __init__(self, equalizer_filter, read_block, num_samples, sample_rate, channels, level,
+                 mix_weights, block_size=1024, analyzer=None, instrumentation=None,
+                 is_running=None, on_finished=None, parametric=None):
+        self.read_block = read_block
+        self.num_samples = num_samples
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.level = level
+        self.mix_weights = mix_weights
+        self.block_size = block_size
+        self.analyzer = analyzer
+        self.instrumentation = instrumentation
+        self.is_running = is_running
+        self.on_finished = on_finished
+        self.parametric = parametric
+        self.position = 0
+
+        if parametric is not None:
+            parametric.reset()
+        else:
+            # Squared bands: the heard response follows the zero-phase display
+            # instead of bumping ~3 dB at every crossover
+            self.streaming = StreamingEqualizer(equalizer_filter, block_size, sample_rate, squared=True)
+            self._bank_buffer = np.empty((len(equalizer_filter.band_limits), channels, block_size),
+                                         dtype=equalizer_filter.dtype)
+
+    def __call__(self, in_data, frame_count, time_info, status):
+        instrumentation = self.instrumentation
+        # perf_counter only when enabled: the disabled cost is this check
+        start = time.perf_counter() if instrumentation is not None and instrumentation.enabled else None
+
+        if self.is_running is not None and not self.is_running():
+            return (np.zeros((frame_count, self.channels), dtype=np.float32), COMPLETE)
+
+        pos = self.position
+        if pos >= self.num_samples:
+            if self.on_finished is not None:
+                self.on_finished()
+            return (np.zeros((frame_count, self.channels), dtype=np.float32), COMPLETE)
+
+        block = self.read_block(pos, frame_count)
+        self.position += block.shape[-1]
+
+        weights = self.mix_weights
+        if self.parametric is not None:
+            output = self.parametric.process_block(block, weights, self.sample_rate) * self.level
+        else:
+            if block.shape[-1] == self.block_size:
+                filtered_signals = self.streaming.process_block(block, out=self._bank_buffer)
+            else:
+                filtered_signals = np.concatenate(list(self.streaming.process(block)), axis=-1)
+            output = np.tensordot(weights * self.level, filtered_signals, axes=1)
+
+        chunk = np.clip(output.T, -1.0, 1.0).astype(np.float32)
+        if len(chunk) < frame_count:
+            chunk = np.pad(chunk, ((0, frame_count - len(chunk)), (0, 0)), 'constant')
+
+        if self.analyzer is not None:
+            self.analyzer.push(chunk)
+        if start is not None:
+            instrumentation.record_callback(start, time.perf_counter(), frame_count / self.sample_rate, status)
+        return (chunk, CONTINUE)
+
+
+class PyAudioSink:
+    """Sound card output through PortAudio; the callback runs on its audio thread"""
+
+    def __init__(self):
+        self._pyaudio = None
+        self._stream = None
+
+    def start(self, callback, sample_rate, channels, block_size):
+        # Imported here so the UI starts (and works without playback)
+        # even when PortAudio is missing
+        import pyaudio
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paFloat32,
+            channels=channels,
+            rate=int(sample_rate),
+            output=True,
+            frames_per_buffer=block_size,
+            stream_callback=callback
+        )
+        self._stream.start_stream()
+
+    def is_active(self):
+        return self._stream is not None and self._stream.is_active()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+
+class NullSink:
+    """Discards audio, calling back on a simulated real-time clock.
+
+    Block n is requested at simulated time n * period and reaches the
+    DAC latency_blocks periods later, as with a device that keeps that
+    many buffers queued. A callback that finishes (in measured wall time)
+    after its block is due at the DAC is a deadline miss: the next
+    callback gets the output underflow flag, as from PortAudio, and the
+    clock slips by the overrun. With realtime=False callbacks run back to
+    back, so minutes of playback take seconds on a headless machine;
+    realtime=True paces them like a sound card. on_block(time), if given,
+    runs before each callback with the simulated time, e.g. to change
+    parameters mid-stream; record=True keeps every block with its DAC time.
+    """
+
+    def __init__(self, latency_blocks=2, realtime=False, on_block=None, record=False):
+        self.latency_blocks = latency_blocks
+        self.realtime = realtime
+        self.on_block = on_block
+        self.record = record
+        self._thread = None
+        self._stop = threading.Event()
+        self.period = 0.0
+        self.reset()
+
+    def reset(self):
+        self.callbacks = 0
+        self.deadline_misses = 0
+        self.durations = []
+        self.blocks = []
+
+    def start(self, callback, sample_rate, channels, block_size):
+        self.reset()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback, sample_rate, channels, block_size))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _open(self, sample_rate, channels):
+        pass
+
+    def _write(self, chunk, dac_time):
+        if self.record:
+            self.blocks.append((dac_time, chunk))
+
+    def _close(self):
+        pass
+
+    def _run(self, callback, sample_rate, channels, block_size):
+        period = block_size / sample_rate
+        latency = self.latency_blocks * period
+        self.period = period
+        self._open(sample_rate, channels)
+        try:
+            slip = 0.0
+            finished = 0.0
+            status = 0
+            wall_start = time.perf_counter()
+            n = 0
+            while not self._stop.is_set():
+                request_time = n * period + slip
+                if self.realtime:
+                    delay = wall_start + request_time - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if self.on_block is not None:
+                    self.on_block(request_time)
+
+                dac_time = request_time + latency
+                time_info = {
+                    'input_buffer_adc_time': 0.0,
+                    'current_time': request_time,
+                    'output_buffer_dac_time': dac_time,
+                }
+                start = time.perf_counter()
+                chunk, flag = callback(None, block_size, time_info, status)
+                duration = time.perf_counter() - start
+
+                # A callback cannot start before the previous one returned,
+                # so slow callbacks eat into the queued buffers
+                finished = max(request_time, finished) + duration
+                self.callbacks += 1
+                self.durations.append(duration)
+                status = 0
+                if finished > dac_time:
+                    # The block missed its DAC slot: the device plays
+                    # silence and the stream resumes that much later
+                    self.deadline_misses += 1
+                    status = STATUS_FLAGS['output_underflow']
+                    slip += finished - dac_time
+                    dac_time = finished
+
+                self._write(chunk, dac_time)
+                if flag != CONTINUE:
+                    break
+                n += 1
+        finally:
+            self._close()
+
+    def get_stats(self):
+        durations = np.array(self.durations) if self.durations else np.zeros(1)
+        return {
+            'callbacks': self.callbacks,
+            'deadline_misses': self.deadline_misses,
+            'period_ms': self.period * 1000,
+            'mean_ms': float(durations.mean()) * 1000,
+            'max_ms': float(durations.max()) * 1000,
+            'load': float(durations.mean()) / self.period,
+        }
+
+
+class WavFileSink(NullSink):
+    """Writes the callback output to a 16-bit WAV file on the simulated clock of NullSink"""
+
+    def __init__(self, path, latency_blocks=2, realtime=False, on_block=None):
+        super().__init__(latency_blocks, realtime, on_block)
+        self.path = path
+        self._writer = None
+
+    def _open(self, sample_rate, channels):
+        self._writer = WavWriter(self.path, sample_rate, channels)
+
+    def _write(self, chunk, dac_time):
+        self._writer.write(chunk.T)
+
+    def _close(self):
+        self._writer.close()
+        self._writer = None
+
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def fingerprint(array):
+    """Content hash of an array (shape, dtype and samples)"""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((array.shape, array.dtype.str)).encode())
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+class BandCache:
+    """LRU cache of per-band filter outputs under a memory cap.
+
+    Keys describe everything a band output depends on: the input (a
+    fingerprint), the band limits, filter order, sample rate and dtype.
+    Gains and enables are deliberately not part of the key, so changing
+    them only needs a remix of cached bands. Entries are evicted least
+    recently used first once max_bytes is exceeded; an array larger than
+    the whole cap is never stored.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        if array.nbytes > self.max_bytes:
+            return False
+        # Cached arrays are shared between callers and must not change
+        array.flags.writeable = False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._entries[key] = array
+            self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return True
+
+    def fits(self, nbytes):
+        return nbytes <= self.max_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
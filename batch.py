@@ -0,0 +1,118 @@
+import argparse
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from filters import BAND_PRESETS, EqualizerFilter
+from mixer import SignalMixer
+from wav_io import render_wav
+
+_equalizer = None
+_mixer = None
+
+
+def _init_worker(band_limits, gains, disabled, dtype, sample_rates=()):
+    # One equalizer per process: its SOS cache is reused for every file
+    global _equalizer, _mixer
+    _equalizer = EqualizerFilter(band_limits, dtype)
+    _mixer = SignalMixer(len(band_limits), dtype)
+    for i, gain in enumerate(gains):
+        _mixer.set_filter_gain(i, gain)
+    for i in disabled:
+        _equalizer.set_filter_enabled(i, False)
+    
+    # scipy is imported and the filters designed on first use: do it here,
+    # so the cost is not timed as part of each worker's first file
+    import scipy.io.wavfile
+    for sample_rate in sample_rates:
+        _equalizer.get_padding(sample_rate)
+
+
+def _get_sample_rate(path):
+    """Sample rate from the WAV header, or None where the wave module cannot read it"""
+    try:
+        with wave.open(str(path), 'rb') as wav_file:
+            return wav_file.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+def _process_file(input_path, output_path, block_size):
+    start = time.perf_counter()
+    duration = render_wav(str(input_path), str(output_path), _equalizer, _mixer, block_size)
+    return duration, time.perf_counter() - start
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Apply one equalizer setting to every WAV file in a directory")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--bands", choices=list(BAND_PRESETS), default="voice",
+                        help="band layout (default: the 5 voice bands)")
+    parser.add_argument("--gains", type=float, nargs="+", default=None,
+                        help="linear gain per band, in band order (default: 1.0)")
+    parser.add_argument("--disable", type=int, nargs="+", default=[], metavar="BAND",
+                        help="1-based numbers of the bands to switch off")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--block-size", type=int, default=65536,
+                        help="samples per processing block")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="processing dtype (float32 halves memory and bandwidth)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    band_limits = BAND_PRESETS[args.bands]
+    gains = args.gains if args.gains is not None else [1.0] * len(band_limits)
+    if len(gains) != len(band_limits):
+        parser.error(f"--gains needs {len(band_limits)} values for the '{args.bands}' bands")
+    if any(not 1 <= band <= len(band_limits) for band in args.disable):
+        parser.error(f"--disable takes band numbers between 1 and {len(band_limits)}")
+    disabled = [band - 1 for band in args.disable]
+    if args.output_dir.resolve() == args.input_dir.resolve():
+        parser.error("output_dir must differ from input_dir: each input would be overwritten while it is read")
+    
+    input_files = sorted(args.input_dir.glob("*.wav"))
+    if not input_files:
+        print(f"No WAV files found in {args.input_dir}")
+        return 1
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    sample_rates = sorted({rate for rate in map(_get_sample_rate, input_files) if rate is not None})
+    
+    total_audio = 0.0
+    failures = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(band_limits, gains, disabled, args.dtype, sample_rates)) as executor:
+        futures = {
+            executor.submit(_process_file, path, args.output_dir / path.name, args.block_size): path
+            for path in input_files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                duration, elapsed = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"{path.name}: error: {e}")
+                continue
+            total_audio += duration
+            print(f"{path.name}: {duration:.1f} s audio in {elapsed:.2f} s "
+                  f"({duration / elapsed:.1f}x real time)")
+    wall_time = time.perf_counter() - start
+    
+    print(f"{len(input_files) - failures}/{len(input_files)} files, {total_audio:.1f} s audio "
+          f"in {wall_time:.2f} s ({total_audio / wall_time:.1f} audio-s per wall-s, "
+          f"{args.workers} workers)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
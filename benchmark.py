@@ -0,0 +1,657 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import scipy
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from analyzer import compute_fft
+from audio_output import EqualizedPlayback, NullSink
+from client import EqualizerClient
+from envelope import EnvelopePyramid
+from filters import (BAND_PRESETS, EqualizerFilter, IIREqualizer, MultirateEqualizer, ParametricEqualizer,
+                     StreamingEqualizer, ToneResponse, create_backend)
+from mixer import SignalMixer
+from plotting import BlitPlot
+from service import BackgroundServer, EqualizerService
+from signal_generator import SignalGenerator
+
+DURATIONS = [1, 60, 600]
+SAMPLE_RATE = 16000
+
+# One-factor-at-a-time sweeps around a 1 s / 16 kHz / 5-band base case
+BASE_CASE = {'duration': 1, 'sample_rate': 16000, 'bands': 'voice'}
+SWEEP = {
+    'duration': [1, 10, 60, 600],
+    'sample_rate': [8000, 16000, 44100, 96000],
+    'bands': list(BAND_PRESETS),
+}
+# Startup budgets in seconds, measured in a fresh interpreter (best of a few runs)
+CORE_IMPORT_BUDGET = 0.5
+FIRST_WINDOW_BUDGET = 1.0
+READY_BUDGET = 3.0
+CORE_MODULES = ['filters', 'mixer', 'signal_generator']
+HEAVY_MODULES = ['scipy', 'matplotlib', 'tkinter', 'pyaudio']
+STAGES = ['generate', 'filter', 'mix', 'fft', 'engine_iir', 'engine_fft', 'plot', 'update_display']
+SEED = 0
+# Smallest sample difference that counts as an audible parameter change (-60 dBFS)
+AUDIBLE_THRESHOLD = 1e-3
+
+
+def time_call(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def compare_backends(durations=DURATIONS, sample_rate=SAMPLE_RATE, repeats=3):
+    equalizer = EqualizerFilter()
+    mixer = SignalMixer()
+    backends = {name: create_backend(name, equalizer, mixer) for name in ('iir', 'fft', 'parametric')}
+    rng = np.random.default_rng(SEED)
+
+    results = []
+    for duration in durations:
+        input_signal = rng.standard_normal(int(duration * sample_rate))
+        row = {'duration': duration}
+        for name, backend in backends.items():
+            # Warm-up call designs the filters / builds the FFT kernel
+            backend.process(input_signal[:sample_rate], sample_rate)
+            row[name] = min(time_call(lambda: backend.process(input_signal, sample_rate),
+                                      repeats if duration < 60 else 1))
+        results.append(row)
+    return results
+
+
+def compare_workers(duration=600, sample_rate=SAMPLE_RATE, bands='voice'):
+    """Segment-parallel process_bank against the single pass, for 1..cpu_count workers"""
+    equalizer = EqualizerFilter(BAND_PRESETS[bands])
+    input_signal = np.random.default_rng(SEED).standard_normal(int(duration * sample_rate))
+    peak = np.max(np.abs(input_signal))
+
+    reference = equalizer.process_bank(input_signal, sample_rate)
+    single = min(time_call(lambda: equalizer.process_bank(input_signal, sample_rate, out=reference), 1))
+
+    workers = 1
+    results = []
+    output = np.empty_like(reference)
+    while True:
+        elapsed = min(time_call(lambda: equalizer.process_bank(input_signal, sample_rate, out=output,
+                                                               workers=workers), 1))
+        results.append({
+            'workers': workers,
+            'time': elapsed,
+            'speedup': single / elapsed,
+            'max_error': float(np.max(np.abs(output - reference)) / peak),
+        })
+        if workers >= (os.cpu_count() or 1):
+            break
+        workers = min(2 * workers, os.cpu_count())
+    return single, results
+
+
+def compare_dtypes(duration=10, sample_rates=(16000, 44100, 96000), repeats=3):
+    """float32 against float64 for each engine: relative RMS/max error, time and bank memory
+
+    The gains alternate 1, 0.5 and 2 so the parametric engine (identity
+    at unity gain) is measured with real boosts and cuts.
+    """
+    rng = np.random.default_rng(SEED)
+    results = []
+    for bands in BAND_PRESETS:
+        for sample_rate in sample_rates:
+            input_signal = rng.standard_normal(int(duration * sample_rate))
+            for name in ('iir', 'fft', 'parametric'):
+                outputs, times = {}, {}
+                for dtype in ('float64', 'float32'):
+                    equalizer = EqualizerFilter(BAND_PRESETS[bands], dtype)
+                    mixer = SignalMixer(len(equalizer.band_limits), dtype)
+                    for i in range(len(equalizer.band_limits)):
+                        mixer.set_filter_gain(i, (1.0, 0.5, 2.0)[i % 3])
+                    engine = create_backend(name, equalizer, mixer)
+                    typed_input = input_signal.astype(dtype)
+                    outputs[dtype] = engine.process(typed_input, sample_rate)
+                    times[dtype] = min(time_call(lambda: engine.process(typed_input, sample_rate), repeats))
+                reference, error = outputs['float64'], outputs['float32'] - outputs['float64']
+                results.append({
+                    'bands': bands,
+                    'sample_rate': sample_rate,
+                    'engine': name,
+                    'rms_error': float(np.sqrt(np.mean(error ** 2)) / np.sqrt(np.mean(reference ** 2))),
+                    'max_error': float(np.max(np.abs(error)) / np.max(np.abs(reference))),
+                    'float64_time': times['float64'],
+                    'float32_time': times['float32'],
+                    'bank_mb': len(BAND_PRESETS[bands]) * len(input_signal) * np.dtype('float32').itemsize / 1e6,
+                })
+    return results
+
+
+def compare_multirate(sample_rates=(44100, 48000, 96000), margins=(0.25, 0.35, 0.5), duration=10,
+                      bands='voice', tones=40):
+    """Multirate against full-rate IIR: speedup, relative RMS error on noise and passband tone gain error"""
+    rng = np.random.default_rng(SEED)
+    band_limits = BAND_PRESETS[bands]
+    low_freq, high_freq = band_limits[0][0], band_limits[-1][1]
+    frequencies = np.geomspace(low_freq, high_freq, tones)
+
+    results = []
+    for sample_rate in sample_rates:
+        equalizer = EqualizerFilter(band_limits)
+        mixer = SignalMixer(len(band_limits))
+        reference_engine = IIREqualizer(equalizer, mixer)
+        input_signal = rng.standard_normal(int(duration * sample_rate))
+        reference = reference_engine.process(input_signal, sample_rate)
+        reference_time = min(time_call(lambda: reference_engine.process(input_signal, sample_rate), 1))
+
+        t = np.arange(sample_rate) / sample_rate
+        steady = slice(sample_rate // 4, -sample_rate // 4)
+        tone_inputs = [np.sin(2 * np.pi * frequency * t) for frequency in frequencies]
+        tone_references = [np.std(reference_engine.process(tone, sample_rate)[steady]) for tone in tone_inputs]
+
+        for margin in margins:
+            engine = MultirateEqualizer(equalizer, mixer, margin)
+            output = engine.process(input_signal, sample_rate)
+            elapsed = min(time_call(lambda: engine.process(input_signal, sample_rate), 1))
+            tone_errors = np.abs([
+                20 * np.log10(np.std(engine.process(tone, sample_rate)[steady]) / tone_reference)
+                for tone, tone_reference in zip(tone_inputs, tone_references)
+            ])
+            up, down, levels = engine.get_plan(sample_rate)
+            results.append({
+                'sample_rate': sample_rate,
+                'margin': margin,
+                'base_rate': sample_rate * up / down,
+                'levels': levels,
+                'speedup': reference_time / elapsed,
+                'rms_error': float(np.sqrt(np.mean((output - reference) ** 2) / np.mean(reference ** 2))),
+                'tone_max_db': float(np.max(tone_errors)),
+                'tone_median_db': float(np.median(tone_errors)),
+            })
+    return results
+
+
+def compare_streaming(duration=10, sample_rate=44100, block_size=1024):
+    """Per-sample cost of streaming the bandpass bank plus mixer against the parametric biquads"""
+    input_signal = np.random.default_rng(SEED).standard_normal(int(duration * sample_rate))
+    blocks = [input_signal[start:start + block_size]
+              for start in range(0, len(input_signal) - block_size + 1, block_size)]
+
+    results = []
+    for bands in BAND_PRESETS:
+        equalizer = EqualizerFilter(BAND_PRESETS[bands])
+        mixer = SignalMixer(len(equalizer.band_limits))
+        weights = mixer.get_mix_weights(equalizer.enabled)
+        streaming = StreamingEqualizer(equalizer, block_size, sample_rate, squared=True)
+        bank_buffer = np.empty((len(weights), block_size))
+        parametric = ParametricEqualizer(equalizer, mixer)
+
+        def run_bank():
+            for block in blocks:
+                np.tensordot(weights, streaming.process_block(block, out=bank_buffer), axes=1)
+
+        def run_parametric():
+            for block in blocks:
+                parametric.process_block(block, weights, sample_rate)
+
+        bank_time = min(time_call(run_bank, 3))
+        parametric_time = min(time_call(run_parametric, 3))
+        samples = len(blocks) * block_size
+        results.append({
+            'bands': bands,
+            'bank_sections': sum(len(sos) for sos in streaming._designs if isinstance(sos, np.ndarray)),
+            'parametric_sections': len(weights),
+            'bank_ns': bank_time / samples * 1e9,
+            'parametric_ns': parametric_time / samples * 1e9,
+            'speedup': bank_time / parametric_time,
+        })
+    return results
+
+
+def run_null_playback(equalizer, weights, source, sample_rate, block_size, latency_blocks, change=None):
+    """Play source through EqualizedPlayback on a NullSink; change=(time, weights) swaps the mix weights"""
+    playback = EqualizedPlayback(equalizer, lambda pos, count: source[np.newaxis, pos:pos + count],
+                                 len(source), sample_rate, 1, 1.0, weights, block_size)
+
+    def on_block(now):
+        # Like a slider move: the callback at or after the change picks it up
+        if change is not None and now >= change[0]:
+            playback.mix_weights = change[1]
+
+    sink = NullSink(latency_blocks, on_block=on_block, record=True)
+    sink.start(playback, sample_rate, 1, block_size)
+    sink.wait()
+    return sink
+
+
+def measure_playback(block_sizes=(128, 256, 512, 1024, 2048), sample_rate=44100, bands='voice',
+                     duration=10, latency_blocks=2):
+    """Deadline misses of the playback callback and gain-change-to-audible latency per block size"""
+    equalizer = EqualizerFilter(BAND_PRESETS[bands])
+    mixer = SignalMixer(len(equalizer.band_limits))
+    weights = mixer.get_mix_weights(equalizer.enabled)
+    mixer.set_filter_gain(0, 2.0)
+    changed_weights = mixer.get_mix_weights(equalizer.enabled)
+    source = 0.1 * np.random.default_rng(SEED).standard_normal(int(duration * sample_rate))
+    change_time = duration / 2
+
+    results = []
+    for block_size in block_sizes:
+        reference = run_null_playback(equalizer, weights, source, sample_rate, block_size, latency_blocks)
+        sink = run_null_playback(equalizer, weights, source, sample_rate, block_size, latency_blocks,
+                                 (change_time, changed_weights))
+
+        difference = np.abs(np.concatenate([chunk for _, chunk in sink.blocks])
+                            - np.concatenate([chunk for _, chunk in reference.blocks]))[:, 0]
+        audible = np.flatnonzero(difference > AUDIBLE_THRESHOLD)
+        latency = None
+        if len(audible):
+            block, offset = divmod(int(audible[0]), block_size)
+            latency = sink.blocks[block][0] + offset / sample_rate - change_time
+
+        stats = sink.get_stats()
+        stats['block_size'] = block_size
+        stats['latency_ms'] = latency * 1000 if latency is not None else None
+        stats['worst_latency_ms'] = (latency_blocks + 1) * stats['period_ms']
+        results.append(stats)
+    return results
+
+
+def load_service(service, clients, requests, duration, sample_rate, bands):
+    """Send requests buffers from each of `clients` threads at once; return the service metrics"""
+    server = BackgroundServer(service).start()
+    signal = np.random.default_rng(SEED).standard_normal(int(duration * sample_rate)).astype(np.float32)
+    barrier = threading.Barrier(clients)
+
+    def client_thread():
+        with EqualizerClient(port=server.port) as client:
+            client.equalize(signal, sample_rate, bands)
+            barrier.wait()
+            if threading.current_thread() is threads[0]:
+                service.reset_metrics()
+            barrier.wait()
+            for _ in range(requests):
+                client.equalize(signal, sample_rate, bands)
+
+    threads = [threading.Thread(target=client_thread) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with EqualizerClient(port=server.port) as client:
+        metrics = client.get_metrics()
+    server.stop()
+    return metrics
+
+
+def compare_service(clients=(1, 4, 16), requests=20, duration=0.25, sample_rate=SAMPLE_RATE, bands='voice'):
+    """Service throughput with one request per pass against micro-batched passes"""
+    results = []
+    for count in clients:
+        for max_batch in (1, 32):
+            metrics = load_service(EqualizerService(max_batch=max_batch), count, requests, duration,
+                                   sample_rate, bands)
+            metrics['clients'] = count
+            metrics['max_batch'] = max_batch
+            results.append(metrics)
+    return results
+
+
+def _make_plot():
+    figure = Figure(figsize=(4, 4), dpi=100)
+    plot = BlitPlot(figure, FigureCanvasAgg(figure), 'Benchmark', 'Time (s)', 'Amplitude', '#cccccc')
+    plot.add_series('signal', label='Signal', color='blue')
+    return plot
+
+
+def benchmark_case(duration, sample_rate, bands, repeats=3):
+    """Time every pipeline stage for one (duration, sample rate, band bank) case"""
+    band_limits = BAND_PRESETS[bands]
+    equalizer = EqualizerFilter(band_limits)
+    mixer = SignalMixer(len(band_limits))
+    generator = SignalGenerator()
+    generator.set_sample_rate(sample_rate)
+    engines = {name: create_backend(name, equalizer, mixer) for name in ('iir', 'fft')}
+    tone_response = ToneResponse(equalizer)
+    weights = mixer.get_mix_weights(equalizer.enabled)
+
+    input_signal = generator.generate_complete_signal(duration)[0]
+    input_signal += 0.1 * np.random.default_rng(SEED).standard_normal(input_signal.shape)
+    bank = equalizer.process_bank(input_signal, sample_rate)
+    for engine in engines.values():
+        engine.process(input_signal[:sample_rate], sample_rate)
+    plot = _make_plot()
+
+    def plot_stage():
+        plot.set_envelope('signal', EnvelopePyramid.from_signal(input_signal, sample_rate))
+        plot.refresh()
+        plot.set_envelope('signal', None)
+
+    def update_display_stage():
+        components, _ = generator.generate_components(duration)
+        signal = components.sum(axis=0)
+        # Generator mode scales each tone by the bank response, as in the UI
+        output = tone_response.process(components, generator.frequencies, weights, sample_rate)
+        compute_fft(signal, sample_rate)
+        compute_fft(components, sample_rate)
+        compute_fft(output, sample_rate)
+        plot_stage()
+
+    stages = {
+        'generate': lambda: generator.generate_components(duration),
+        'filter': lambda: equalizer.process_bank(input_signal, sample_rate, out=bank),
+        'mix': lambda: mixer.mix_signals(bank, equalizer.enabled),
+        'fft': lambda: compute_fft(input_signal, sample_rate),
+        'engine_iir': lambda: engines['iir'].process(input_signal, sample_rate),
+        'engine_fft': lambda: engines['fft'].process(input_signal, sample_rate),
+        'plot': plot_stage,
+        'update_display': update_display_stage,
+    }
+
+    results = []
+    for stage in STAGES:
+        timings = time_call(stages[stage], repeats if duration < 60 else 1)
+        results.append({
+            'stage': stage,
+            'duration': duration,
+            'sample_rate': sample_rate,
+            'bands': bands,
+            'min': min(timings),
+            'median': float(np.median(timings)),
+        })
+    return results
+
+
+def sweep_cases(full=False):
+    if full:
+        return [
+            {'duration': duration, 'sample_rate': sample_rate, 'bands': bands}
+            for duration in SWEEP['duration']
+            for sample_rate in SWEEP['sample_rate']
+            for bands in SWEEP['bands']
+        ]
+
+    cases = []
+    for name, values in SWEEP.items():
+        for value in values:
+            case = dict(BASE_CASE, **{name: value})
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+
+def case_key(result):
+    return f"{result['stage']}/{result['duration']}s/{result['sample_rate']}Hz/{result['bands']}"
+
+
+def run_suite(cases, repeats=3):
+    results = []
+    for case in cases:
+        print(f"{case['duration']:>4} s {case['sample_rate']:>6} Hz {case['bands']:<13}", end=' ', flush=True)
+        case_results = benchmark_case(repeats=repeats, **case)
+        print(' '.join(f"{r['stage']}={r['median'] * 1000:.1f}ms" for r in case_results))
+        results.extend(case_results)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'matplotlib': matplotlib.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'seed': SEED,
+        'repeats': repeats,
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """Return (key, baseline s, current s, ratio) for every case slower than 1 + threshold"""
+    baseline_times = {case_key(r): r['median'] for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = case_key(result)
+        if key not in baseline_times or baseline_times[key] <= 0:
+            continue
+        ratio = result['median'] / baseline_times[key]
+        if ratio > 1 + threshold:
+            regressions.append((key, baseline_times[key], result['median'], ratio))
+    return regressions
+
+
+def measure_core_import(repeats=5):
+    """Best time to import the processing core, plus any heavy module it dragged in"""
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(CORE_MODULES)}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    best, loaded = float('inf'), []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', script], cwd=cwd, check=True,
+                                capture_output=True, text=True).stdout.splitlines()
+        best = min(best, float(output[0]))
+        loaded = output[1].split() if len(output) > 1 else []
+    return best, loaded
+
+
+def _display_command(command):
+    """command as is with a display, wrapped in xvfb-run on a headless X11 system, or None"""
+    if sys.platform in ('win32', 'darwin') or os.environ.get('DISPLAY'):
+        return command
+    xvfb_run = shutil.which('xvfb-run')
+    if xvfb_run is None:
+        return None
+    return [xvfb_run, '--auto-servernum', *command]
+
+
+def measure_first_window(repeats=3):
+    """Best (first window, ready) times from main.py --startup-time.
+
+    Without a display the UI runs under Xvfb; RuntimeError if neither is
+    available or the UI fails to start.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    command = _display_command([sys.executable, main_path, '--startup-time'])
+    if command is None:
+        raise RuntimeError("no display available and xvfb-run not found (install Xvfb or set DISPLAY)")
+
+    best = None
+    for _ in range(repeats):
+        process = subprocess.run(command, capture_output=True, text=True, timeout=120)
+        times = dict(line.split() for line in process.stdout.splitlines()
+                     if line.startswith(('first_window ', 'ready ')))
+        if process.returncode != 0 or len(times) != 2:
+            output = (process.stderr or process.stdout).strip().splitlines()
+            raise RuntimeError(f"UI failed to start (exit code {process.returncode})"
+                               + (f": {output[-1]}" if output else ""))
+        run = (float(times['first_window']), float(times['ready']))
+        best = run if best is None else (min(best[0], run[0]), min(best[1], run[1]))
+    return best
+
+
+def check_startup():
+    """Print the startup measurements and return the list of budget violations"""
+    failures = []
+
+    core_time, loaded = measure_core_import()
+    print(f"core import   {core_time * 1000:8.1f} ms (budget {CORE_IMPORT_BUDGET * 1000:.0f} ms)")
+    if core_time > CORE_IMPORT_BUDGET:
+        failures.append("core import over budget")
+    if loaded:
+        print(f"core import pulled in: {', '.join(loaded)}")
+        failures.append("core import loads GUI/audio/scipy modules")
+
+    try:
+        first_window, ready = measure_first_window()
+    except RuntimeError as e:
+        failures.append(f"first window not measured: {e}")
+    else:
+        print(f"first window  {first_window * 1000:8.1f} ms (budget {FIRST_WINDOW_BUDGET * 1000:.0f} ms)")
+        print(f"UI ready      {ready * 1000:8.1f} ms (budget {READY_BUDGET * 1000:.0f} ms)")
+        if first_window > FIRST_WINDOW_BUDGET:
+            failures.append("first window over budget")
+        if ready > READY_BUDGET:
+            failures.append("UI ready over budget")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks for the equalizer processing pipeline")
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('backends', help="compare the IIR and FFT engines on 1 s, 60 s and 10 min inputs")
+
+    run_parser = subparsers.add_parser('run', help="time every stage over the sweep and write JSON")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--repeats', type=int, default=3)
+    run_parser.add_argument('--full', action='store_true',
+                            help="full cartesian sweep instead of one factor at a time")
+
+    parallel_parser = subparsers.add_parser('parallel', help="segment-parallel filtering speedup against core count")
+    parallel_parser.add_argument('--duration', type=float, default=600)
+    parallel_parser.add_argument('--bands', choices=list(BAND_PRESETS), default='voice')
+
+    dtype_parser = subparsers.add_parser('dtype', help="accuracy and speed of the float32 pipeline against float64")
+    dtype_parser.add_argument('--duration', type=float, default=10)
+
+    multirate_parser = subparsers.add_parser('multirate', help="multirate engine speedup and passband accuracy")
+    multirate_parser.add_argument('--duration', type=float, default=10)
+
+    playback_parser = subparsers.add_parser('playback', help="callback deadline misses and parameter-change latency "
+                                                             "on a simulated audio clock")
+    playback_parser.add_argument('--bands', choices=list(BAND_PRESETS), default='voice')
+    playback_parser.add_argument('--sample-rate', type=int, default=44100)
+    playback_parser.add_argument('--duration', type=float, default=10)
+    playback_parser.add_argument('--latency-blocks', type=int, default=2,
+                                 help="buffers queued ahead of the DAC (default 2)")
+
+    service_parser = subparsers.add_parser('service', help="local service throughput with and without micro-batching")
+    service_parser.add_argument('--requests', type=int, default=20, help="requests per client")
+    service_parser.add_argument('--duration', type=float, default=0.25, help="seconds of audio per request")
+    service_parser.add_argument('--bands', choices=list(BAND_PRESETS), default='voice')
+
+    streaming_parser = subparsers.add_parser('streaming', help="per-sample cost of the streaming bank against the "
+                                                               "parametric biquad engine")
+    streaming_parser.add_argument('--block-size', type=int, default=1024)
+
+    subparsers.add_parser('startup', help="check core import, first-window and ready-UI times against their budgets")
+
+    compare_parser = subparsers.add_parser('compare', help="flag regressions against a stored baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help="allowed slowdown as a fraction of the baseline (default 0.2)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'run':
+        report = run_suite(sweep_cases(args.full), args.repeats)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+        return 0
+
+    if args.command == 'parallel':
+        single, results = compare_workers(args.duration, SAMPLE_RATE, args.bands)
+        print(f"single pass: {single:.3f} s ({args.duration:g} s input, {os.cpu_count()} cores)")
+        print(f"{'workers':>8} {'time (s)':>10} {'speedup':>8} {'max error':>10}")
+        for row in results:
+            print(f"{row['workers']:>8} {row['time']:>10.3f} {row['speedup']:>7.2f}x {row['max_error']:>10.1e}")
+        return 0
+
+    if args.command == 'dtype':
+        print(f"{'bands':<13} {'rate':>6} {'engine':>10} {'rms err':>9} {'max err':>9} "
+              f"{'f64 (s)':>8} {'f32 (s)':>8} {'f32 bank':>9}")
+        for row in compare_dtypes(args.duration):
+            print(f"{row['bands']:<13} {row['sample_rate']:>6} {row['engine']:>10} {row['rms_error']:>9.1e} "
+                  f"{row['max_error']:>9.1e} {row['float64_time']:>8.3f} {row['float32_time']:>8.3f} "
+                  f"{row['bank_mb']:>6.1f} MB")
+        return 0
+
+    if args.command == 'multirate':
+        print(f"{'rate':>6} {'margin':>6} {'base':>6} {'speedup':>8} {'rms err':>8} {'tone max':>9} {'median':>7}")
+        for row in compare_multirate(duration=args.duration):
+            print(f"{row['sample_rate']:>6} {row['margin']:>6.2f} {row['base_rate']:>6.0f} "
+                  f"{row['speedup']:>7.1f}x {row['rms_error']:>8.1e} {row['tone_max_db']:>6.2f} dB "
+                  f"{row['tone_median_db']:>4.2f} dB")
+        return 0
+
+    if args.command == 'playback':
+        results = measure_playback(sample_rate=args.sample_rate, bands=args.bands, duration=args.duration,
+                                   latency_blocks=args.latency_blocks)
+        print(f"{'block':>6} {'period':>9} {'mean cb':>9} {'max cb':>9} {'load':>6} {'misses':>7} "
+              f"{'latency':>10} {'bound':>10}")
+        for row in results:
+            latency = f"{row['latency_ms']:7.1f} ms" if row['latency_ms'] is not None else "  inaudible"
+            print(f"{row['block_size']:>6} {row['period_ms']:>6.2f} ms {row['mean_ms']:>6.3f} ms "
+                  f"{row['max_ms']:>6.2f} ms {row['load']:>6.1%} {row['deadline_misses']:>7} "
+                  f"{latency} {row['worst_latency_ms']:>7.1f} ms")
+        return 1 if any(row['deadline_misses'] for row in results) else 0
+
+    if args.command == 'service':
+        print(f"{'clients':>7} {'batch':>5} {'req/s':>8} {'audio x':>8} {'mean batch':>10} "
+              f"{'latency':>10} {'max queue':>9}")
+        for row in compare_service(requests=args.requests, duration=args.duration, bands=args.bands):
+            print(f"{row['clients']:>7} {row['max_batch']:>5} {row['requests_per_s']:>8.1f} "
+                  f"{row['audio_seconds_per_s']:>7.1f}x {row['mean_batch_size']:>10.1f} "
+                  f"{row['latency_mean_ms']:>7.1f} ms {row['max_queue_depth']:>9}")
+        return 0
+
+    if args.command == 'streaming':
+        print(f"{'bands':<13} {'biquads':>12} {'bank':>10} {'parametric':>10} {'speedup':>8}")
+        for row in compare_streaming(block_size=args.block_size):
+            print(f"{row['bands']:<13} {row['bank_sections']:>5} vs {row['parametric_sections']:>3} "
+                  f"{row['bank_ns']:>7.1f} ns {row['parametric_ns']:>7.1f} ns {row['speedup']:>7.1f}x")
+        return 0
+
+    if args.command == 'startup':
+        return 1 if check_startup() else 0
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        for key, before, after, ratio in regressions:
+            print(f"REGRESSION {key}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({ratio:.2f}x)")
+        if not regressions:
+            print(f"No regressions above {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    results = compare_backends()
+    print(f"{'input':>8} {'iir (s)':>10} {'fft (s)':>10} {'speedup':>8} {'param (s)':>10} {'speedup':>8}")
+    for row in results:
+        print(f"{row['duration']:>7}s {row['iir']:>10.4f} {row['fft']:>10.4f} "
+              f"{row['iir'] / row['fft']:>7.1f}x {row['parametric']:>10.4f} "
+              f"{row['iir'] / row['parametric']:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
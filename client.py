@@ -0,0 +1,69 @@
+import http.client
+import json
+import socket
+from urllib.parse import urlencode
+
+import numpy as np
+
+from service import DEFAULT_PORT
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class EqualizerClient:
+    """Blocking client for service.py, keeping one connection open.
+
+    Not thread-safe: use one client per thread to send concurrent
+    requests (which is what lets the service batch them).
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, timeout=60):
+        if unix_path is not None:
+            self._connection = _UnixHTTPConnection(unix_path, timeout)
+        else:
+            self._connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, target, body=None):
+        self._connection.request(method, target, body, {'Content-Type': 'application/octet-stream'})
+        response = self._connection.getresponse()
+        payload = response.read()
+        if response.status == 400:
+            raise ValueError(payload.decode())
+        if response.status != 200:
+            raise RuntimeError(f"{response.status} {response.reason}: {payload.decode()}")
+        return payload
+
+    def equalize(self, signal, sample_rate, bands='voice', gains=None, disable=()):
+        """Equalize a mono (samples,) or (channels x samples) signal; gains and 1-based disable as in batch.py"""
+        signal = np.asarray(signal, dtype=np.float32)
+        frames = np.atleast_2d(signal)
+        params = {'bands': bands, 'rate': int(sample_rate), 'channels': len(frames)}
+        if gains is not None:
+            params['gains'] = ','.join(repr(float(gain)) for gain in gains)
+        if disable:
+            params['disable'] = ','.join(str(band) for band in disable)
+
+        payload = self._request('POST', '/equalize?' + urlencode(params), frames.T.astype('<f4').tobytes())
+        output = np.frombuffer(payload, '<f4').reshape(-1, len(frames)).T
+        return output[0] if signal.ndim == 1 else output
+
+    def get_metrics(self):
+        return json.loads(self._request('GET', '/metrics'))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
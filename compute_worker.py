@@ -0,0 +1,78 @@
+import threading
+
+
+class ComputeCancelled(Exception):
+    """Raised by ComputeWorker.check_cancelled to abandon a superseded computation"""
+
+
+class ComputeWorker:
+    """Background thread that only ever computes the most recent request.
+
+    submit() overwrites any request that has not been picked up yet, so a
+    burst of slider events collapses into at most one computation in
+    flight plus one waiting. Results (or exceptions) are handed back on
+    the Tk thread through root.after. Long computations can publish()
+    partial results and call check_cancelled() between steps, so a new
+    request never waits for an obsolete one to finish.
+    """
+    
+    def __init__(self, root, compute, on_result, on_error=None):
+        self.root = root
+        self.compute = compute
+        self.on_result = on_result
+        self.on_error = on_error
+        
+        self._condition = threading.Condition()
+        self._pending = None
+        self._has_pending = False
+        self._running = True
+        self.dropped = 0
+        self.cancelled = 0
+        
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def submit(self, snapshot):
+        with self._condition:
+            if self._has_pending:
+                self.dropped += 1
+            self._pending = snapshot
+            self._has_pending = True
+            self._condition.notify()
+    
+    def check_cancelled(self):
+        """Raise ComputeCancelled if a newer request is waiting or the worker is stopping"""
+        if self._has_pending or not self._running:
+            raise ComputeCancelled()
+    
+    def publish(self, result):
+        """Hand an intermediate result to on_result before the computation returns"""
+        self.root.after(0, self.on_result, result)
+    
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._has_pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                snapshot = self._pending
+                self._pending = None
+                self._has_pending = False
+            
+            try:
+                result = self.compute(snapshot)
+            except ComputeCancelled:
+                self.cancelled += 1
+                continue
+            except Exception as e:
+                if self.on_error is not None:
+                    self.root.after(0, self.on_error, e)
+                continue
+            self.root.after(0, self.on_result, result)
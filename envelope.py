@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class EnvelopePyramid:
+    """Multi-resolution min/max envelope of a (channels x samples) signal.
+
+    Level 0 keeps the min and max of every bin_size samples, and each
+    further level merges `factor` bins of the level below. A query picks
+    the coarsest level that still gives at least one bin per pixel column,
+    so the number of points returned is bounded by the plot width (times
+    2 * factor) and does not depend on the signal length.
+
+    The pyramid is built incrementally with append(), so a file can be
+    fed block by block without holding it in memory.
+    """
+
+    # Level-0 bins per channel for for_length(); longer signals get wider bins
+    MAX_BINS = 2 ** 20
+
+    def __init__(self, sample_rate, bin_size=16, factor=4, read_raw=None):
+        self.sample_rate = sample_rate
+        self.bin_size = bin_size
+        self.factor = factor
+        self.read_raw = read_raw
+        self.num_samples = 0
+        self.levels = []
+
+        self._mins = []
+        self._maxs = []
+        self._tail = None
+
+    @classmethod
+    def from_signal(cls, signal, sample_rate, **kwargs):
+        signal = np.atleast_2d(signal)
+        pyramid = cls(sample_rate, read_raw=lambda start, stop: signal[:, start:stop], **kwargs)
+        pyramid.append(signal)
+        pyramid.finish()
+        return pyramid
+
+    @classmethod
+    def for_length(cls, num_samples, sample_rate, bin_size=16, max_bins=None, **kwargs):
+        """Empty pyramid whose level 0 stays within max_bins for a signal of num_samples
+
+        Memory no longer grows with the length of a file; zooms finer than
+        the widened bins are served by read_raw.
+        """
+        if max_bins is None:
+            max_bins = cls.MAX_BINS
+        bin_size = max(bin_size, -(-num_samples // max_bins))
+        return cls(sample_rate, bin_size=bin_size, **kwargs)
+
+    def append(self, block):
+        block = np.atleast_2d(block)
+        self.num_samples += block.shape[1]
+        if self._tail is not None:
+            block = np.concatenate([self._tail, block], axis=1)
+
+        whole = block.shape[1] // self.bin_size * self.bin_size
+        if whole:
+            bins = block[:, :whole].reshape(block.shape[0], -1, self.bin_size)
+            self._mins.append(bins.min(axis=2))
+            self._maxs.append(bins.max(axis=2))
+        self._tail = block[:, whole:] if whole < block.shape[1] else None
+
+    def finish(self):
+        if self._tail is not None:
+            self._mins.append(self._tail.min(axis=1, keepdims=True))
+            self._maxs.append(self._tail.max(axis=1, keepdims=True))
+            self._tail = None
+
+        mins = np.concatenate(self._mins, axis=1)
+        maxs = np.concatenate(self._maxs, axis=1)
+        self._mins = self._maxs = None
+
+        bin_size = self.bin_size
+        self.levels = [(bin_size, mins, maxs)]
+        while mins.shape[1] > 1:
+            pad = -mins.shape[1] % self.factor
+            if pad:
+                mins = np.concatenate([mins, mins[:, -1:].repeat(pad, axis=1)], axis=1)
+                maxs = np.concatenate([maxs, maxs[:, -1:].repeat(pad, axis=1)], axis=1)
+            mins = mins.reshape(mins.shape[0], -1, self.factor).min(axis=2)
+            maxs = maxs.reshape(maxs.shape[0], -1, self.factor).max(axis=2)
+            bin_size *= self.factor
+            self.levels.append((bin_size, mins, maxs))
+
+    def get_peak(self):
+        """Largest absolute value of the whole signal, from the top level"""
+        _, mins, maxs = self.levels[-1]
+        return max(float(-mins.min()), float(maxs.max()))
+
+    def get_duration(self):
+        return self.num_samples / self.sample_rate
+
+    def query(self, t_start, t_stop, columns):
+        """Return (x, y) for the range [t_start, t_stop] at about `columns` points wide
+
+        y is (channels x points). Envelope bins become a vertical min/max
+        zig-zag; short ranges are returned as raw samples when available.
+        """
+        start = max(int(np.floor(t_start * self.sample_rate)), 0)
+        stop = min(int(np.ceil(t_stop * self.sample_rate)) + 1, self.num_samples)
+        if stop <= start:
+            start, stop = 0, self.num_samples
+
+        samples_per_column = (stop - start) / max(columns, 1)
+        if samples_per_column < self.bin_size and self.read_raw is not None:
+            y = np.atleast_2d(self.read_raw(start, stop))
+            return np.arange(start, stop) / self.sample_rate, y
+
+        bin_size, mins, maxs = self.levels[0]
+        for level in self.levels[1:]:
+            if level[0] > samples_per_column:
+                break
+            bin_size, mins, maxs = level
+
+        first = start // bin_size
+        last = -(-stop // bin_size)
+        x = (np.arange(first, last) * bin_size + bin_size / 2) / self.sample_rate
+        y = np.empty((mins.shape[0], 2 * (last - first)))
+        y[:, 0::2] = mins[:, first:last]
+        y[:, 1::2] = maxs[:, first:last]
+        return np.repeat(x, 2), y
@@ -1,70 +1,895 @@
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+
 import numpy as np
-from scipy import signal
+
+from band_cache import fingerprint
+from instrumentation import Instrumentation
+
+_PASSTHROUGH = 'passthrough'
+
+
+def _signal():
+    # scipy.signal costs about a second to import; load it on the first
+    # filter design instead of when the module is imported
+    from scipy import signal
+    return signal
+
+
+def decay_length(sos, tolerance):
+    """Samples until the slowest pole of `sos` has decayed below `tolerance`"""
+    radius = max(np.max(np.abs(np.roots(section[3:]))) for section in sos)
+    return int(np.ceil(np.log(tolerance) / np.log(radius)))
+
+
+def fractional_octave_bands(fraction, low_center, high_center):
+    # Base-2 centres anchored at 1 kHz, edges at fc * 2**(+-1 / (2 * fraction))
+    half_step = 2.0 ** (1.0 / (2 * fraction))
+    first = int(round(fraction * np.log2(low_center / 1000.0)))
+    last = int(round(fraction * np.log2(high_center / 1000.0)))
+    centers = 1000.0 * 2.0 ** (np.arange(first, last + 1) / fraction)
+    return [(round(float(fc / half_step), 2), round(float(fc * half_step), 2))
+            for fc in centers]
+
+
+BAND_PRESETS = {
+    'voice': [(80, 250), (250, 500), (500, 1000), (1000, 2000), (2000, 4000)],
+    'octave': fractional_octave_bands(1, 31.5, 16000),
+    'third-octave': fractional_octave_bands(3, 20, 20000),
+}
+
 
 class EqualizerFilter:
-    def __init__(self):
+    # Lowest normalized band edge whose design survives float32 coefficients
+    MIN_SINGLE_PRECISION_EDGE = 0.01
+    
+    def __init__(self, band_limits=None, dtype=np.float64, passthrough_band=None):
         self.BAND1_RANGE = (80, 250)     
         self.BAND2_RANGE = (250, 500)    
         self.BAND3_RANGE = (500, 1000)   
         self.BAND4_RANGE = (1000, 2000)  
         self.BAND5_RANGE = (2000, 4000)  
         
-        self.band_limits = [
-            self.BAND1_RANGE,  
-            self.BAND2_RANGE,  
-            self.BAND3_RANGE,  
-            self.BAND4_RANGE,  
-            self.BAND5_RANGE  
-        ]
+        if band_limits is None:
+            # The original five bands pass band 3 through unfiltered once it
+            # is squeezed against Nyquist
+            if passthrough_band is None:
+                passthrough_band = 2
+            band_limits = [
+                self.BAND1_RANGE,  
+                self.BAND2_RANGE,  
+                self.BAND3_RANGE,  
+                self.BAND4_RANGE,  
+                self.BAND5_RANGE  
+            ]
         
-        self.enabled = [True, True, True, True, True]
+        self.band_limits = list(band_limits)
+        
+        self.enabled = [True] * len(self.band_limits)
+        # Index of the band passed through instead of dropped when it has no
+        # width left below Nyquist; None drops every such band
+        self.passthrough_band = passthrough_band
         
         self.filter_order = 4
         self.sample_rate = 16000  
+        # Sample and coefficient dtype. float32 halves memory and bandwidth;
+        # the output differs from float64 by 1e-5 to 1e-4 (RMS, relative) for
+        # every preset up to 96 kHz, since bands with very low normalized edges keep
+        # float64 coefficients (python benchmark.py dtype)
+        self.dtype = np.dtype(dtype)
+        
+        # (band limits, order, sample rate) -> SOS array, None (silent band)
+        # or _PASSTHROUGH
+        self._sos_cache = {}
     
     def set_filter_enabled(self, filter_idx, enabled):
-        if 0 <= filter_idx < 5:
+        if 0 <= filter_idx < len(self.band_limits):
             self.enabled[filter_idx] = enabled
     
     def is_filter_enabled(self, filter_idx):
-        if 0 <= filter_idx < 5:
+        if 0 <= filter_idx < len(self.band_limits):
             return self.enabled[filter_idx]
         return False
     
+    def set_band_limits(self, filter_idx, low_freq, high_freq):
+        if 0 <= filter_idx < len(self.band_limits):
+            old_limits = self.band_limits[filter_idx]
+            self.band_limits[filter_idx] = (low_freq, high_freq)
+            if old_limits not in self.band_limits:
+                self._sos_cache = {
+                    key: sos for key, sos in self._sos_cache.items()
+                    if key[0] != old_limits
+                }
+    
+    def design_filter(self, filter_idx, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        
+        key = (self.band_limits[filter_idx], self.filter_order, sample_rate)
+        if key in self._sos_cache:
+            return self._sos_cache[key]
+        
+        low_freq, high_freq = self.band_limits[filter_idx]
+        
+        nyquist = sample_rate / 2.0
+        
+        if low_freq >= nyquist:
+            sos = None
+        else:
+            high_freq = min(high_freq, nyquist * 0.99)
+            
+            low_norm = low_freq / nyquist
+            high_norm = high_freq / nyquist
+            
+            # SOS designs stay accurate down to tiny normalized edges, so low
+            # bands keep their real limits at any rate; only a band with no
+            # usable width left is dropped instead of being shifted
+            if low_norm < 1e-6:
+                sos = None
+            elif high_norm <= low_norm:
+                # Degenerate band squeezed against Nyquist
+                sos = _PASSTHROUGH if filter_idx == self.passthrough_band else None
+            else:
+                # Designed in float64, stored in the working dtype so that
+                # filtering never upcasts the samples, except for bands whose
+                # poles sit so close to z = 1 that float32 coefficients would
+                # move them (those few bands are filtered in float64)
+                sos = _signal().butter(self.filter_order, [low_norm, high_norm],
+                                    btype='bandpass', output='sos')
+                if low_norm >= self.MIN_SINGLE_PRECISION_EDGE:
+                    sos = sos.astype(self.dtype)
+        
+        self._sos_cache[key] = sos
+        return sos
+    
+    def get_padding(self, sample_rate=None, tolerance=1e-9):
+        """Samples of context either side of a block for zero-phase filtering to match a single pass"""
+        designs = [self.design_filter(i, sample_rate) for i in range(len(self.band_limits))]
+        return max([decay_length(sos, tolerance) for sos in designs if isinstance(sos, np.ndarray)], default=0)
+    
+    def power_response(self, freqs, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        
+        # |H|^2 per band (bands x freqs): the zero-phase response of filtfilt
+        response = np.zeros((len(self.band_limits), len(freqs)))
+        for i in range(len(self.band_limits)):
+            sos = self.design_filter(i, sample_rate)
+            if sos is _PASSTHROUGH:
+                response[i] = 1.0
+            elif sos is not None:
+                _, h = _signal().sosfreqz(sos, worN=freqs, fs=sample_rate)
+                response[i] = np.abs(h) ** 2
+        return response
+    
     def apply_filter(self, input_signal, filter_idx, sample_rate=None):
         if sample_rate is None:
             sample_rate = self.sample_rate
         else:
-            self.sample_rate = sample_rate
+            self.set_sample_rate(sample_rate)
             
-        if not (0 <= filter_idx < 5) or not self.enabled[filter_idx]:
+        input_signal = np.asarray(input_signal, dtype=self.dtype)
+        if not (0 <= filter_idx < len(self.band_limits)) or not self.enabled[filter_idx]:
             return np.zeros_like(input_signal)
-            
-        low_freq, high_freq = self.band_limits[filter_idx]
         
-        nyquist = sample_rate / 2.0
+        sos = self.design_filter(filter_idx, sample_rate)
         
-        if low_freq >= nyquist:
+        if sos is None:
             return np.zeros_like(input_signal)
-            
-        high_freq = min(high_freq, nyquist * 0.99)
+        if sos is _PASSTHROUGH:
+            return input_signal
         
-        low_norm = low_freq / nyquist
-        high_norm = high_freq / nyquist
+        # Bands with float64 coefficients filter in float64; return the working dtype
+        filtered_signal = _signal().sosfiltfilt(sos, input_signal)
         
-        low_norm = max(low_norm, 0.001)
-        high_norm = min(high_norm, 0.999)
+        return filtered_signal.astype(self.dtype, copy=False)
+    
+    def process_bank(self, input_signal, sample_rate=None, out=None, workers=None, tolerance=1e-9,
+                     cache=None):
+        """Zero-phase filter every band into a (bands x ...) array.
+
+        With a BandCache, enabled bands already filtered for the same input
+        samples, limits, order and rate are copied from it instead of being
+        filtered again, and new outputs are added to it.
+
+        With workers > 1 each band is split into overlapping segments
+        filtered on a thread pool (sosfiltfilt releases the GIL). Every
+        segment is padded on both sides by decay_length(sos, tolerance)
+        samples, so the start-up transients of both passes die out before
+        the part that is kept; the stitched result matches the
+        single-pass one to about tolerance times the signal peak.
+
+        The result is always in the working dtype. With float32, bands that
+        keep float64 coefficients (see design_filter) are still filtered in
+        float64: sosfiltfilt returns a float64 temporary the length of the
+        input (or segment) for each of them, which is cast into out.
+        """
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        else:
+            self.set_sample_rate(sample_rate)
+        
+        input_signal = np.asarray(input_signal, dtype=self.dtype)
+        shape = (len(self.band_limits),) + input_signal.shape
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output buffer must have shape {shape}")
         
-        if high_norm <= low_norm:
-            high_norm = low_norm + 0.001
-            if high_norm >= 0.999:
-                return input_signal if filter_idx == 2 else np.zeros_like(input_signal)
+        if cache is not None:
+            input_key = ('filtfilt', fingerprint(input_signal), self.filter_order, sample_rate, self.dtype.str)
+        
+        tasks = []
+        computed = []
+        for i in range(len(self.band_limits)):
+            sos = self.design_filter(i, sample_rate) if self.enabled[i] else None
+            if sos is None:
+                out[i] = 0.0
+                continue
+            if sos is _PASSTHROUGH:
+                out[i] = input_signal
+                continue
+            
+            if cache is not None:
+                cached = cache.get(input_key + (self.band_limits[i],))
+                if cached is not None:
+                    out[i] = cached
+                    continue
+                computed.append(i)
+            
+            if workers is None or workers <= 1:
+                out[i] = _signal().sosfiltfilt(sos, input_signal)
+            else:
+                tasks.extend(self._segment_tasks(i, sos, shape[-1], workers, tolerance))
         
-        b, a = signal.butter(self.filter_order, [low_norm, high_norm], btype='bandpass')
+        if tasks:
+            sosfiltfilt = _signal().sosfiltfilt
+            
+            def run(task):
+                i, sos, start, stop, padded_start, padded_stop = task
+                filtered = sosfiltfilt(sos, input_signal[..., padded_start:padded_stop])
+                out[i][..., start:stop] = filtered[..., start - padded_start:stop - padded_start]
+            
+            with ThreadPoolExecutor(workers) as executor:
+                list(executor.map(run, tasks))
         
-        filtered_signal = signal.filtfilt(b, a, input_signal)
+        for i in computed:
+            cache.put(input_key + (self.band_limits[i],), out[i].copy())
         
-        return filtered_signal
+        return out
+    
+    def _segment_tasks(self, band_idx, sos, n_samples, workers, tolerance):
+        pad = decay_length(sos, tolerance)
+        # Segments shorter than a few pads would spend most of their time
+        # on overlap; fall back to fewer (down to one) segments
+        segments = max(1, min(workers, n_samples // (4 * pad)))
+        bounds = np.linspace(0, n_samples, segments + 1).astype(int)
+        return [
+            (band_idx, sos, start, stop, max(start - pad, 0), min(stop + pad, n_samples))
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
     
     def set_sample_rate(self, rate):
-        self.sample_rate = rate 
\ No newline at end of file
+        if rate != self.sample_rate:
+            self._sos_cache = {
+                key: sos for key, sos in self._sos_cache.items()
+                if key[2] == rate
+            }
+        self.sample_rate = rate 
+
+
+class StreamingEqualizer:
+    """Causal, block-by-block counterpart of EqualizerFilter.
+
+    Every band runs forward only (sosfilt) and keeps its filter state
+    between blocks, so memory stays constant however long the input is.
+    A block is returned as soon as it has been pushed: the buffering
+    latency is one block, block_size / sample_rate (64 ms for the default
+    1024 samples at 16 kHz). On top of that each bandpass adds its group
+    delay, about 4.9, 3.3, 1.7, 0.8 and 0.4 ms at the centres of the
+    default bands (see group_delay).
+
+    All bands are filtered whatever their enabled flag so that toggling a
+    band never restarts its filter; enables are applied by the mixer.
+    Blocks may be 1-D or (channels x samples); each channel keeps its own
+    filter state.
+    
+    Output blocks are in the equalizer's dtype; bands that keep float64
+    coefficients under float32 filter each block through a block-sized
+    float64 temporary.
+    
+    A single causal pass gives each band |H| instead of filtfilt's |H|^2,
+    and the bands overlap by about 3 dB at every crossover. With
+    squared=True each band runs its sections twice, so the magnitudes
+    are |H|^2 as in the zero-phase bank; the sum then stays within about
+    0.7 dB of the display (1.8 dB for octave bands at 44.1 kHz, where
+    neighbouring phases interact), at twice the cost and group delay.
+    """
+    
+    def __init__(self, equalizer_filter, block_size=1024, sample_rate=None, squared=False):
+        if sample_rate is None:
+            sample_rate = equalizer_filter.sample_rate
+        
+        self.equalizer_filter = equalizer_filter
+        self.block_size = block_size
+        self.sample_rate = sample_rate
+        self.squared = squared
+        self.dtype = equalizer_filter.dtype
+        self.reset()
+    
+    def reset(self):
+        self._designs = [
+            self.equalizer_filter.design_filter(i, self.sample_rate)
+            for i in range(len(self.equalizer_filter.band_limits))
+        ]
+        if self.squared:
+            self._designs = [np.concatenate([sos, sos]) if isinstance(sos, np.ndarray) else sos
+                             for sos in self._designs]
+        # Per-band state, sized on the first block to (sections, channels..., 2)
+        self._zi = [None] * len(self._designs)
+    
+    def get_latency(self):
+        return self.block_size / self.sample_rate
+    
+    def group_delay(self, filter_idx):
+        sos = self._designs[filter_idx]
+        if not isinstance(sos, np.ndarray):
+            return 0.0
+        
+        low_freq, high_freq = self.equalizer_filter.band_limits[filter_idx]
+        center = np.sqrt(low_freq * high_freq)
+        _, response = _signal().sosfreqz(sos, worN=[center - 0.5, center + 0.5],
+                                      fs=self.sample_rate)
+        phase = np.unwrap(np.angle(response))
+        return -(phase[1] - phase[0]) / (2 * np.pi)
+    
+    def process_block(self, block, out=None):
+        if block.shape[-1] > self.block_size:
+            raise ValueError(f"Block longer than block_size ({self.block_size})")
+        
+        block = np.asarray(block, dtype=self.dtype)
+        shape = (len(self._designs),) + block.shape
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output buffer must have shape {shape}")
+        
+        for i, sos in enumerate(self._designs):
+            if sos is None:
+                out[i] = 0.0
+            elif sos is _PASSTHROUGH:
+                out[i] = block
+            else:
+                if self._zi[i] is None:
+                    self._zi[i] = np.zeros((sos.shape[0],) + block.shape[:-1] + (2,),
+                                           dtype=np.result_type(sos, block))
+                out[i], self._zi[i] = _signal().sosfilt(sos, block, zi=self._zi[i])
+        
+        return out
+    
+    def process(self, input_signal):
+        for start in range(0, input_signal.shape[-1], self.block_size):
+            yield self.process_block(input_signal[..., start:start + self.block_size])
+
+
+class IIREqualizer:
+    def __init__(self, equalizer_filter, signal_mixer, workers=None, band_cache=None):
+        self.equalizer_filter = equalizer_filter
+        self.signal_mixer = signal_mixer
+        self.workers = workers
+        self.band_cache = band_cache
+        self.instrumentation = Instrumentation()
+        self._bank_buffer = None
+    
+    def get_padding(self, sample_rate, tolerance=1e-9):
+        return self.equalizer_filter.get_padding(sample_rate, tolerance)
+    
+    def process(self, input_signal, sample_rate=None):
+        bank_shape = (len(self.equalizer_filter.band_limits),) + np.shape(input_signal)
+        if self._bank_buffer is None or self._bank_buffer.shape != bank_shape:
+            self._bank_buffer = np.empty(bank_shape, dtype=self.equalizer_filter.dtype)
+        
+        with self.instrumentation.stage('filter'):
+            filtered_signals = self.equalizer_filter.process_bank(
+                input_signal, sample_rate, out=self._bank_buffer, workers=self.workers,
+                cache=self.band_cache
+            )
+        with self.instrumentation.stage('mix'):
+            return self.signal_mixer.mix_signals(filtered_signals, self.equalizer_filter.enabled)
+
+
+class OverlapSaveEqualizer:
+    """Frequency-domain equalizer equivalent to IIREqualizer.
+
+    The combined response sum(gain * |H_band|^2) of the enabled bands
+    (|H|^2 because filtfilt applies each band twice with zero phase) is
+    turned into a windowed linear-phase FIR and applied by overlap-save
+    convolution. The kernel is rebuilt only when gains, enables, band
+    limits, order or sample rate change; the FIR delay is compensated so
+    the output lines up with the input.
+    """
+    
+    def __init__(self, equalizer_filter, signal_mixer, fir_length=None):
+        self.equalizer_filter = equalizer_filter
+        self.signal_mixer = signal_mixer
+        self.fir_length = fir_length
+        self.instrumentation = Instrumentation()
+        self._kernel_key = None
+        self._kernel_fft = None
+        self._kernel_length = None
+        self._bank_key = None
+        self._bank_response = None
+    
+    def _get_fir_length(self, sample_rate):
+        if self.fir_length is not None:
+            return self.fir_length
+        # ~0.25 s of taps keeps the 80 Hz edge sharp at any rate
+        return 2 ** int(np.ceil(np.log2(sample_rate / 4)))
+    
+    def get_padding(self, sample_rate, tolerance=1e-9):
+        # The centred FIR reaches half its length either side
+        return self._get_fir_length(sample_rate) // 2
+    
+    def _get_kernel(self, sample_rate):
+        equalizer = self.equalizer_filter
+        fir_length = self._get_fir_length(sample_rate)
+        fft_size = 4 * fir_length
+        
+        bank_key = (tuple(equalizer.band_limits), equalizer.filter_order,
+                    sample_rate, fir_length)
+        key = (tuple(self.signal_mixer.filter_gains), tuple(equalizer.enabled), bank_key)
+        if key == self._kernel_key:
+            return self._kernel_fft, self._kernel_length
+        
+        if bank_key != self._bank_key:
+            freqs = np.fft.rfftfreq(fir_length, 1.0 / sample_rate)
+            self._bank_response = equalizer.power_response(freqs, sample_rate)
+            self._bank_key = bank_key
+        
+        # Gain or enable changes only redo this gains x band-matrix product
+        weights = np.where(equalizer.enabled, self.signal_mixer.filter_gains, 0.0)
+        response = weights @ self._bank_response
+        
+        fir = np.roll(np.fft.irfft(response, fir_length), fir_length // 2)
+        fir *= np.hanning(fir_length)
+        
+        self._kernel_key = key
+        # complex64 for float32: numpy >= 2 FFTs keep single precision, and
+        # process() casts the spectra for older versions
+        self._kernel_fft = np.fft.rfft(fir, fft_size).astype(np.result_type(equalizer.dtype, np.complex64))
+        self._kernel_length = fir_length
+        return self._kernel_fft, self._kernel_length
+    
+    def process(self, input_signal, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.equalizer_filter.sample_rate
+        else:
+            self.equalizer_filter.set_sample_rate(sample_rate)
+        
+        with self.instrumentation.stage('kernel'):
+            kernel_fft, fir_length = self._get_kernel(sample_rate)
+        fft_size = 2 * (len(kernel_fft) - 1)
+        step = fft_size - fir_length + 1
+        delay = fir_length // 2
+        
+        # Channels (if any) lead, time runs along the last axis
+        channels = np.shape(input_signal)[:-1]
+        n_samples = np.shape(input_signal)[-1]
+        dtype = self.equalizer_filter.dtype
+        padded = np.zeros(channels + (fir_length - 1 + n_samples + delay + step,), dtype=dtype)
+        padded[..., fir_length - 1:fir_length - 1 + n_samples] = input_signal
+        
+        output = np.empty(channels + (n_samples + delay + step,), dtype=dtype)
+        with self.instrumentation.stage('convolve'):
+            for start in range(0, n_samples + delay, step):
+                segment = np.fft.rfft(padded[..., start:start + fft_size]).astype(kernel_fft.dtype, copy=False)
+                output[..., start:start + step] = np.fft.irfft(
+                    segment * kernel_fft, fft_size
+                )[..., fir_length - 1:]
+        
+        return output[..., delay:delay + n_samples]
+
+
+class MultirateEqualizer:
+    """IIR equalizer that filters each band at a decimated rate.
+
+    A polyphase resampler (resample_poly) first brings the input down to
+    the lowest whole-kHz rate that still holds the top band below
+    `margin` of its Nyquist (16 kHz for the voice bands). From there the
+    signal is halved repeatedly, an octave tree, and every band runs at
+    the lowest level that keeps its upper edge below `margin` of the
+    level's Nyquist, so the 80-250 Hz band of a 48 kHz file is filtered
+    at a 1 kHz sample rate (16 kHz halved four times) instead of 48 kHz
+    and its design is far better conditioned.
+    On the way back up each level adds its mixed bands to the
+    interpolated sum of the levels below, and the result is resampled to
+    the input rate. Filtering stays zero-phase and resample_poly
+    compensates its own delay, so the output lines up with the input;
+    `benchmark.py multirate` reports speed and passband accuracy.
+    """
+    
+    MIN_LEVEL_SAMPLES = 256
+    STOPBAND_DB = 60
+    
+    def __init__(self, equalizer_filter, signal_mixer, margin=0.5):
+        self.equalizer_filter = equalizer_filter
+        self.signal_mixer = signal_mixer
+        self.margin = margin
+        self.instrumentation = Instrumentation()
+        self._resampling_filters = {}
+    
+    def _get_resampling_filter(self, up, down):
+        # Only content below margin * Nyquist of the lower rate matters, and
+        # only what would alias into it has to be rejected: a transition band
+        # that wide needs far fewer taps than resample_poly's default design
+        max_rate = max(up, down)
+        if max_rate not in self._resampling_filters:
+            width = 2 * (1 - self.margin) / max_rate
+            numtaps, beta = _signal().kaiserord(self.STOPBAND_DB, width)
+            numtaps |= 1
+            self._resampling_filters[max_rate] = _signal().firwin(
+                numtaps, 1.0 / max_rate, window=('kaiser', beta)
+            )
+        return self._resampling_filters[max_rate]
+    
+    def _resample(self, x, up, down):
+        window = self._get_resampling_filter(up, down)
+        return _signal().resample_poly(x, up, down, axis=-1, window=window).astype(x.dtype, copy=False)
+    
+    def get_plan(self, sample_rate, n_samples=None):
+        """Return (up, down, levels): the front-end ratio and each band's octave level"""
+        band_limits = self.equalizer_filter.band_limits
+        top_freq = max(high_freq for _, high_freq in band_limits)
+        base_rate = 1000 * int(np.ceil(2 * top_freq / self.margin / 1000))
+        short = n_samples is not None and n_samples * base_rate / sample_rate < self.MIN_LEVEL_SAMPLES
+        if base_rate < sample_rate and not short:
+            ratio = Fraction(base_rate, int(round(sample_rate)))
+            up, down = ratio.numerator, ratio.denominator
+        else:
+            up, down = 1, 1
+            base_rate = sample_rate
+        
+        base_samples = None if n_samples is None else n_samples * up / down
+        levels = []
+        for low_freq, high_freq in band_limits:
+            level = 0
+            while base_rate / 2 ** (level + 2) * self.margin >= high_freq:
+                if base_samples is not None and base_samples / 2 ** (level + 1) < self.MIN_LEVEL_SAMPLES:
+                    break
+                level += 1
+            levels.append(level)
+        return up, down, levels
+    
+    def get_padding(self, sample_rate, tolerance=1e-9):
+        """Samples of context either side of a block for process() to match a single pass
+        
+        Each band's decay at its level, plus the spread of every resampling
+        filter on the way down and back up, in input-rate samples.
+        """
+        up, down, levels = self.get_plan(sample_rate)
+        base_rate = sample_rate * up / down
+        padding = 0.0
+        for i, level in enumerate(levels):
+            sos = self.equalizer_filter.design_filter(i, base_rate / 2 ** level)
+            if isinstance(sos, np.ndarray):
+                padding = max(padding, decay_length(sos, tolerance) * 2 ** level * down / up)
+        
+        if up != down:
+            padding += len(self._get_resampling_filter(up, down)) / up
+        for level in range(max(levels, default=0)):
+            padding += len(self._get_resampling_filter(1, 2)) * 2 ** level * down / up
+        return int(np.ceil(padding))
+    
+    def get_alignment(self, sample_rate):
+        """Input samples after which the decimation phases of every level repeat
+        
+        A block processed on its own only matches the whole signal when it
+        starts at a multiple of this.
+        """
+        up, down, levels = self.get_plan(sample_rate)
+        return down * 2 ** max(levels, default=0)
+    
+    def process(self, input_signal, sample_rate=None):
+        equalizer = self.equalizer_filter
+        if sample_rate is None:
+            sample_rate = equalizer.sample_rate
+        else:
+            equalizer.set_sample_rate(sample_rate)
+        
+        sosfiltfilt = _signal().sosfiltfilt
+        dtype = equalizer.dtype
+        
+        input_signal = np.asarray(input_signal, dtype=dtype)
+        n_samples = input_signal.shape[-1]
+        up, down, levels = self.get_plan(sample_rate, n_samples)
+        base_rate = sample_rate * up / down
+        weights = self.signal_mixer.get_mix_weights(equalizer.enabled)
+        active = [i for i in range(len(levels)) if weights[i] != 0]
+        depth = max((levels[i] for i in active), default=0)
+        
+        with self.instrumentation.stage('decimate'):
+            signals = [input_signal]
+            if up != down:
+                signals[0] = self._resample(input_signal, up, down)
+            for _ in range(depth):
+                signals.append(self._resample(signals[-1], 1, 2))
+        
+        output = None
+        for level in range(depth, -1, -1):
+            level_signal = signals[level]
+            mixed = np.zeros_like(level_signal)
+            with self.instrumentation.stage('filter'):
+                for i in active:
+                    if levels[i] != level:
+                        continue
+                    sos = equalizer.design_filter(i, base_rate / 2 ** level)
+                    if sos is _PASSTHROUGH:
+                        mixed += weights[i] * level_signal
+                    elif sos is not None:
+                        mixed += weights[i] * sosfiltfilt(sos, level_signal)
+            
+            if output is not None:
+                with self.instrumentation.stage('interpolate'):
+                    mixed += self._resample(output, 2, 1)[..., :level_signal.shape[-1]]
+            output = mixed
+        
+        if up != down:
+            with self.instrumentation.stage('interpolate'):
+                output = self._resample(output, down, up)[..., :n_samples]
+        return output
+
+
+class ParametricEqualizer:
+    """Series equalizer with one RBJ-cookbook biquad per band.
+
+    Instead of splitting the signal into bandpasses and summing them, the
+    bands are cascaded: the first band is a low shelf and the last a high
+    shelf with their half-gain points at the inner band edge, and every
+    other band is a peaking filter at its geometric centre with the band
+    width (in octaves) as bandwidth. Each mix weight (gain, or 0 for a
+    disabled band) is folded into its biquad, floored at MIN_GAIN (-60
+    dB), so a sample costs one biquad per band and one pass instead of
+    the bank's 4 sections per band run twice by filtfilt. Coefficients
+    are only recomputed when the weights, band limits or sample rate
+    change.
+
+    The cookbook puts the band edges at half the centre gain in dB, so a
+    -60 dB cut would still be -30 dB at the edges and -10 to -25 dB over
+    its neighbours. Past +-2 * EDGE_DB the peaks are narrowed to keep
+    their edges at +-EDGE_DB: a disabled middle band leaves its
+    neighbours' centres within ~1 dB. A shelf's slope is fixed, so its
+    corner is moved outwards instead, towards SHELF_EDGE_DB at the inner
+    edge but never past its own band (or 0.45 * rate): a disabled end
+    band still costs its neighbour ~6-12 dB for the voice and octave
+    bands, and more for the narrow third-octave ones.
+    Sections whose centre sits below MIN_SINGLE_PRECISION_EDGE of Nyquist
+    keep float64 coefficients, as in the bank; the cascade then runs in
+    float64 and the output is cast back to the working dtype.
+
+    Unlike the bank this is not a bandpass: with every gain at 1 the
+    output equals the input, including outside the band range. Filtering
+    is causal (minimum phase), so process_block can stream with state
+    kept between blocks; process() starts from rest every call.
+    """
+    
+    MIN_GAIN = 1e-3
+    EDGE_DB = 3.0
+    SHELF_EDGE_DB = 6.0
+    causal = True
+    
+    def __init__(self, equalizer_filter, signal_mixer):
+        self.equalizer_filter = equalizer_filter
+        self.signal_mixer = signal_mixer
+        self.instrumentation = Instrumentation()
+        self._sos_key = None
+        self._sos = None
+        self._zi = None
+    
+    def design(self, weights, sample_rate):
+        """(bands x 6) second-order sections for the given mix weights"""
+        equalizer = self.equalizer_filter
+        key = (tuple(weights), tuple(equalizer.band_limits), sample_rate, equalizer.dtype.str)
+        if key == self._sos_key:
+            return self._sos
+        
+        limits = np.array(equalizer.band_limits, dtype=float)
+        low, high = limits[:, 0], limits[:, 1]
+        freqs = np.sqrt(low * high)
+        kinds = np.zeros(len(limits), dtype=int)
+        if len(limits) > 1:
+            freqs[0], kinds[0] = high[0], -1
+            freqs[-1], kinds[-1] = low[-1], 1
+        
+        amplitude = np.sqrt(np.maximum(np.asarray(weights, dtype=float), self.MIN_GAIN))
+        # Power gain wanted at the band edges: half the centre gain in dB as
+        # in the cookbook, but never beyond EDGE_DB
+        gain_db = 40 * np.log10(amplitude)
+        narrow = np.abs(gain_db) > 2 * self.EDGE_DB
+        edge_power = 10 ** (np.clip(gain_db / 2, -self.EDGE_DB, self.EDGE_DB) / 10)
+        centres = freqs.copy()
+        if len(limits) > 1:
+            shelf_power = 10 ** (np.clip(gain_db[[0, -1]] / 2, -self.SHELF_EDGE_DB, self.SHELF_EDGE_DB) / 10)
+            ratio = self._shelf_corner_ratio(amplitude[[0, -1]], shelf_power)
+            ratio[np.abs(gain_db[[0, -1]]) <= 2 * self.SHELF_EDGE_DB] = 1.0
+            # The corner never leaves its own band, nor passes 0.45 * rate
+            ratio = np.minimum(ratio, (high / low)[[0, -1]])
+            ratio[1] = max(min(ratio[1], 0.45 * sample_rate / low[-1]), 1.0)
+            freqs[0] /= ratio[0]
+            freqs[-1] *= ratio[1]
+        
+        # Sections beyond Nyquist stay at unity
+        w0 = 2 * np.pi * np.minimum(freqs, 0.49 * sample_rate) / sample_rate
+        cos_w0, sin_w0 = np.cos(w0), np.sin(w0)
+        
+        # Peaking: alpha from the bandwidth in octaves
+        octaves = np.log2(high / low)
+        alpha = sin_w0 * np.sinh(np.log(2) / 2 * octaves * w0 / sin_w0)
+        # Analog peak (s^2 + s A/Q + 1) / (s^2 + s / (A Q) + 1): this 1/Q
+        # scaling moves the edge gain from A^2 (power) to edge_power
+        A2 = amplitude[narrow] ** 2
+        alpha[narrow] *= np.sqrt((edge_power[narrow] - 1) / (A2 - edge_power[narrow] / A2))
+        sos = np.stack([1 + alpha * amplitude, -2 * cos_w0, 1 - alpha * amplitude,
+                        1 + alpha / amplitude, -2 * cos_w0, 1 - alpha / amplitude], axis=1)
+        
+        # Shelves with slope S = 1
+        A = amplitude
+        beta = 2 * np.sqrt(A) * sin_w0 / np.sqrt(2)
+        low_shelf = np.stack([
+            A * ((A + 1) - (A - 1) * cos_w0 + beta),
+            2 * A * ((A - 1) - (A + 1) * cos_w0),
+            A * ((A + 1) - (A - 1) * cos_w0 - beta),
+            (A + 1) + (A - 1) * cos_w0 + beta,
+            -2 * ((A - 1) + (A + 1) * cos_w0),
+            (A + 1) + (A - 1) * cos_w0 - beta,
+        ], axis=1)
+        high_shelf = np.stack([
+            A * ((A + 1) + (A - 1) * cos_w0 + beta),
+            -2 * A * ((A - 1) + (A + 1) * cos_w0),
+            A * ((A + 1) + (A - 1) * cos_w0 - beta),
+            (A + 1) - (A - 1) * cos_w0 + beta,
+            2 * ((A - 1) - (A + 1) * cos_w0),
+            (A + 1) - (A - 1) * cos_w0 - beta,
+        ], axis=1)
+        sos[kinds == -1] = low_shelf[kinds == -1]
+        sos[kinds == 1] = high_shelf[kinds == 1]
+        sos /= sos[:, 3:4]
+        sos[centres >= sample_rate / 2] = [1, 0, 0, 1, 0, 0]
+        
+        self._sos_key = key
+        # Poles this close to z = 1 move with float32 coefficients
+        if np.min(np.minimum(freqs, centres)) / (sample_rate / 2) >= equalizer.MIN_SINGLE_PRECISION_EDGE:
+            sos = sos.astype(equalizer.dtype)
+        self._sos = sos
+        return self._sos
+    
+    @staticmethod
+    def _shelf_corner_ratio(amplitude, edge_power, max_ratio=1e3):
+        """Edge-to-corner frequency ratio putting a S = 1 shelf at edge_power
+        
+        Bisection on the analog low shelf's power response, which runs
+        monotonically from A^4 at DC to 1 and is A^2 at the corner.
+        """
+        amplitude = np.asarray(amplitude, dtype=float)
+        low, high = np.zeros_like(amplitude), np.full_like(amplitude, np.log(max_ratio))
+        cut = amplitude < 1
+        for _ in range(60):
+            mid = (low + high) / 2
+            w2 = np.exp(2 * mid)
+            power = (amplitude ** 2 * ((amplitude - w2) ** 2 + 2 * amplitude * w2)
+                     / ((1 - amplitude * w2) ** 2 + 2 * amplitude * w2))
+            short = (power < edge_power) == cut
+            low = np.where(short, mid, low)
+            high = np.where(short, high, mid)
+        return np.exp((low + high) / 2)
+    
+    def get_response(self, freqs, weights, sample_rate):
+        """Complex frequency response of the cascade at freqs (Hz)"""
+        _, response = _signal().sosfreqz(self.design(weights, sample_rate).astype(float),
+                                         worN=np.asarray(freqs, dtype=float), fs=sample_rate)
+        return response
+    
+    def get_padding(self, sample_rate, tolerance=1e-9, weights=None):
+        """Samples of history after which a filter started from rest matches the stream"""
+        if weights is None:
+            weights = self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled)
+        return decay_length(self.design(weights, sample_rate).astype(float), tolerance)
+    
+    def reset(self):
+        self._zi = None
+    
+    def process_block(self, block, weights=None, sample_rate=None):
+        """Filter the next block of a stream; weights default to the mixer's"""
+        if sample_rate is None:
+            sample_rate = self.equalizer_filter.sample_rate
+        if weights is None:
+            weights = self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled)
+        
+        with self.instrumentation.stage('design'):
+            sos = self.design(weights, sample_rate)
+        block = np.asarray(block, dtype=self.equalizer_filter.dtype)
+        if self._zi is None or self._zi.shape[1:-1] != block.shape[:-1]:
+            self._zi = np.zeros((sos.shape[0],) + block.shape[:-1] + (2,), dtype=np.result_type(sos, block))
+        # The state carries over a coefficient change, like a hardware EQ
+        with self.instrumentation.stage('filter'):
+            output, self._zi = _signal().sosfilt(sos, block, zi=self._zi)
+        return output.astype(block.dtype, copy=False)
+    
+    def process(self, input_signal, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self.equalizer_filter.sample_rate
+        else:
+            self.equalizer_filter.set_sample_rate(sample_rate)
+        
+        weights = self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled)
+        with self.instrumentation.stage('design'):
+            sos = self.design(weights, sample_rate)
+        dtype = self.equalizer_filter.dtype
+        with self.instrumentation.stage('filter'):
+            return _signal().sosfilt(sos, np.asarray(input_signal, dtype=dtype)).astype(dtype, copy=False)
+
+
+class ToneResponse:
+    """Equalizer output for inputs that are sums of pure tones.
+
+    Through the zero-phase bank a sine comes out as the same sine scaled
+    by sum(weight * |H_band(f)|^2), so synthetic inputs can skip time
+    domain filtering altogether. |H|^2 is tabulated once per bank on a
+    log-spaced grid (fine enough for the steep low-band skirts) and
+    interpolated at the tone frequencies; the combined table is only
+    re-weighted when gains or enables change. The interpolated gains are
+    within ~1e-6 of sosfreqz; the output differs from IIREqualizer only
+    by filtfilt's edge transients, which last a few milliseconds for the
+    voice bands and longer for narrow low third-octave bands.
+    """
+    
+    def __init__(self, equalizer_filter, table_size=4096, min_freq=10.0):
+        self.equalizer_filter = equalizer_filter
+        self.table_size = table_size
+        self.min_freq = min_freq
+        self._table_key = None
+        self._log_freqs = None
+        self._bank_table = None
+        self._weights = None
+        self._combined = None
+    
+    def _get_combined(self, weights, sample_rate):
+        equalizer = self.equalizer_filter
+        table_key = (tuple(equalizer.band_limits), equalizer.filter_order, sample_rate)
+        if table_key != self._table_key:
+            freqs = np.geomspace(self.min_freq, sample_rate / 2.0, self.table_size)
+            self._log_freqs = np.log(freqs)
+            self._bank_table = equalizer.power_response(freqs, sample_rate)
+            self._table_key = table_key
+            self._weights = None
+        
+        if self._weights is None or not np.array_equal(weights, self._weights):
+            self._combined = weights @ self._bank_table
+            self._weights = np.array(weights)
+        return self._combined
+    
+    def get_gains(self, frequencies, weights, sample_rate=None):
+        """Combined response at each tone frequency for the given mix weights"""
+        if sample_rate is None:
+            sample_rate = self.equalizer_filter.sample_rate
+        combined = self._get_combined(np.asarray(weights, dtype=float), sample_rate)
+        log_freqs = np.log(np.maximum(np.asarray(frequencies, dtype=float), self.min_freq))
+        return np.interp(log_freqs, self._log_freqs, combined)
+    
+    def process(self, components, frequencies, weights, sample_rate=None):
+        """Equalize (tones x samples) components whose frequencies are known"""
+        gains = self.get_gains(frequencies, weights, sample_rate)
+        return gains.astype(components.dtype) @ components
+
+
+BACKENDS = {
+    'iir': IIREqualizer,
+    'fft': OverlapSaveEqualizer,
+    'multirate': MultirateEqualizer,
+    'parametric': ParametricEqualizer,
+}
+
+
+def create_backend(name, equalizer_filter, signal_mixer):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown equalizer backend: {name}")
+    return BACKENDS[name](equalizer_filter, signal_mixer)
@@ -0,0 +1,188 @@
+import bisect
+import csv
+import time
+
+# PortAudio callback status flags (pyaudio.paInputUnderflow ... paPrimingOutput),
+# duplicated here so the counters work without importing pyaudio
+STATUS_FLAGS = {
+    'input_underflow': 0x1,
+    'input_overflow': 0x2,
+    'output_underflow': 0x4,
+    'output_overflow': 0x8,
+    'priming_output': 0x10,
+}
+
+# Histogram bin edges in milliseconds
+CALLBACK_DURATION_EDGES = [0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50]
+CALLBACK_JITTER_EDGES = [0.1, 0.5, 1, 2, 5, 10, 20, 50]
+
+
+class Histogram:
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+
+    def get_bins(self):
+        """Return (label, count) pairs, one per bin"""
+        bounds = [0] + self.edges + [float('inf')]
+        return [(f"{low:g}-{high:g}", count) for low, high, count in zip(bounds, bounds[1:], self.counts)]
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    """Per-stage timers plus audio callback duration/jitter histograms and status counters.
+
+    While disabled, stage() returns a shared no-op context manager and
+    the record methods return immediately, so the hooks can stay in the
+    hot paths. Updates are plain attribute writes from the worker and
+    audio threads; readers get a consistent-enough snapshot for display.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = dict.fromkeys(STATUS_FLAGS, 0)
+        self.counters['callbacks'] = 0
+        self.counters['deadline_overruns'] = 0
+        self.callback_duration = Histogram(CALLBACK_DURATION_EDGES)
+        self.callback_jitter = Histogram(CALLBACK_JITTER_EDGES)
+        self._last_callback = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        # A gap while disabled is not jitter
+        self._last_callback = None
+
+    def stage(self, name):
+        """Context manager timing one step under `name`"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.add(seconds)
+
+    def record_callback(self, start, end, period, status):
+        """Record one audio callback that ran from `start` to `end` (perf_counter seconds)
+
+        period is the audio duration of the buffer; a callback slower than
+        that cannot keep up. Jitter is how far the spacing between
+        consecutive callbacks strays from the period.
+        """
+        if not self.enabled:
+            return
+        duration = end - start
+        self.record('audio_callback', duration)
+        self.callback_duration.add(duration * 1000)
+        if self._last_callback is not None:
+            self.callback_jitter.add(abs(start - self._last_callback - period) * 1000)
+        self._last_callback = start
+
+        counters = self.counters
+        counters['callbacks'] += 1
+        if duration > period:
+            counters['deadline_overruns'] += 1
+        if status:
+            for name, flag in STATUS_FLAGS.items():
+                if status & flag:
+                    counters[name] += 1
+
+    def end_callbacks(self):
+        """Forget the last callback time, e.g. when a stream stops"""
+        self._last_callback = None
+
+    def get_rows(self):
+        """Flatten everything into (section, name, field, value) rows"""
+        rows = []
+        for name, stats in sorted(self.stages.items()):
+            rows.append(('stage', name, 'count', stats.count))
+            rows.append(('stage', name, 'mean_ms', stats.get_mean() * 1000))
+            rows.append(('stage', name, 'min_ms', stats.min * 1000 if stats.count else 0.0))
+            rows.append(('stage', name, 'max_ms', stats.max * 1000))
+            rows.append(('stage', name, 'last_ms', stats.last * 1000))
+            rows.append(('stage', name, 'total_ms', stats.total * 1000))
+        for name, value in self.counters.items():
+            rows.append(('counter', name, 'count', value))
+        for name, histogram in (('callback_duration_ms', self.callback_duration),
+                                ('callback_jitter_ms', self.callback_jitter)):
+            for label, count in histogram.get_bins():
+                rows.append(('histogram', name, label, count))
+        return rows
+
+    def format_report(self):
+        lines = [f"{'stage':<16}{'n':>7}{'mean ms':>10}{'max ms':>10}{'last ms':>10}"]
+        for name, stats in sorted(self.stages.items()):
+            lines.append(f"{name:<16}{stats.count:>7}{stats.get_mean() * 1000:>10.2f}"
+                         f"{stats.max * 1000:>10.2f}{stats.last * 1000:>10.2f}")
+        lines.append("")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<20}{value:>8}")
+        for title, histogram in (("callback duration (ms)", self.callback_duration),
+                                 ("callback jitter (ms)", self.callback_jitter)):
+            lines.append("")
+            lines.append(title)
+            for label, count in histogram.get_bins():
+                lines.append(f"  {label:>12}{count:>8}")
+        return "\n".join(lines)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['section', 'name', 'field', 'value'])
+            writer.writerows(self.get_rows())
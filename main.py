@@ -1,24 +1,78 @@
+import time
+
+START_TIME = time.perf_counter()
+
+import argparse
 import tkinter as tk
-import numpy as np
-import matplotlib
 import traceback
 import sys
 
-matplotlib.use('TkAgg')  
+from filters import BAND_PRESETS
 
-from signal_generator import SignalGenerator
-from filters import EqualizerFilter
-from mixer import SignalMixer
-from ui import EqualizerUI
+def show_loading_window(root):
+    """Put a window on screen before the heavy GUI modules are imported"""
+    root.title("Equalizer")
+    root.geometry("1700x950")
+    label = tk.Label(root, text="Cargando...", font=("Arial", 14))
+    label.pack(expand=True)
+    root.update()
+    return label
 
 def main():
+    parser = argparse.ArgumentParser(description="Interactive audio equalizer")
+    parser.add_argument("--bands", choices=list(BAND_PRESETS), default="voice",
+                        help="band layout: 5 voice bands, 10 octave or 31 third-octave bands")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="sample dtype for the whole pipeline; float32 halves memory use")
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="memory cap of the per-band output cache in MB (default: 256)")
+    parser.add_argument("--audio-output", choices=["pyaudio", "null", "wav"], default="pyaudio",
+                        help="playback device: sound card, a silent real-time clock or a WAV file")
+    parser.add_argument("--audio-file", default="playback.wav",
+                        help="output file for --audio-output wav (default: playback.wav)")
+    parser.add_argument("--instrument", action="store_true",
+                        help="collect stage timings and audio callback statistics from the start")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print the time to first window and to a ready UI, then exit")
+    args = parser.parse_args()
+    
     try:
-        signal_gen = SignalGenerator()
-        equalizer = EqualizerFilter()
-        mixer = SignalMixer()
-        
         root = tk.Tk()
-        app = EqualizerUI(root, signal_gen, equalizer, mixer)
+        loading_label = show_loading_window(root)
+        first_window = time.perf_counter() - START_TIME
+        
+        # matplotlib, scipy and the UI are only imported once the window is up
+        import matplotlib
+        matplotlib.use('TkAgg')
+        
+        from signal_generator import SignalGenerator
+        from filters import EqualizerFilter
+        from mixer import SignalMixer
+        from ui import EqualizerUI
+        from audio_output import NullSink, PyAudioSink, WavFileSink
+        
+        signal_gen = SignalGenerator(args.dtype)
+        equalizer = EqualizerFilter(BAND_PRESETS[args.bands], args.dtype)
+        mixer = SignalMixer(len(equalizer.band_limits), args.dtype)
+        
+        if args.audio_output == "null":
+            audio_sink_factory = lambda: NullSink(realtime=True)
+        elif args.audio_output == "wav":
+            audio_sink_factory = lambda: WavFileSink(args.audio_file, realtime=True)
+        else:
+            audio_sink_factory = PyAudioSink
+        
+        loading_label.destroy()
+        app = EqualizerUI(root, signal_gen, equalizer, mixer, args.cache_mb * 2 ** 20, audio_sink_factory)
+        app.instrumentation.set_enabled(args.instrument)
+        
+        if args.startup_time:
+            root.update()
+            print(f"first_window {first_window:.4f}")
+            print(f"ready {time.perf_counter() - START_TIME:.4f}")
+            app.compute_worker.stop()
+            root.destroy()
+            return
         
         app.run()
     except Exception as e:
@@ -46,4 +100,4 @@ def main():
             pass
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
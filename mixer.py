@@ -1,26 +1,29 @@
 import numpy as np
 
 class SignalMixer:
-    def __init__(self):
-        self.filter_gains = [1.0, 1.0, 1.0, 1.0, 1.0]
+    def __init__(self, num_bands=5, dtype=np.float64):
+        self.filter_gains = [1.0] * num_bands
+        self.dtype = np.dtype(dtype)
         
     def set_filter_gain(self, filter_idx, gain):
-        if 0 <= filter_idx < 5:
+        if 0 <= filter_idx < len(self.filter_gains):
             self.filter_gains[filter_idx] = gain
             
     def get_filter_gain(self, filter_idx):
-        if 0 <= filter_idx < 5:
+        if 0 <= filter_idx < len(self.filter_gains):
             return self.filter_gains[filter_idx]
         return 0.0
             
+    def get_mix_weights(self, filter_enabled):
+        # A fresh array every call, safe to hand to another thread
+        return np.where(filter_enabled, self.filter_gains, 0.0).astype(self.dtype)
+    
     def mix_signals(self, filtered_signals, filter_enabled):
-        if len(filtered_signals) != 5:
-            raise ValueError("Expected 5 filtered signals")
-            
-        mixed_signal = np.zeros_like(filtered_signals[0])
+        if len(filtered_signals) != len(self.filter_gains):
+            raise ValueError(f"Expected {len(self.filter_gains)} filtered signals")
+        
+        weights = self.get_mix_weights(filter_enabled)
         
-        for i in range(5):
-            if filter_enabled[i]:
-                mixed_signal += filtered_signals[i] * self.filter_gains[i]
-                
-        return mixed_signal 
\ No newline at end of file
+        # gains (bands,) x band matrix (bands x samples); accepts the array
+        # from process_bank without copying
+        return np.tensordot(weights, np.asarray(filtered_signals), axes=1) 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import numpy as np
+
+
+class BlitPlot:
+    """Single-axes figure whose Line2D artists are created once and updated in place.
+
+    Lines are animated: a full canvas draw renders only the static layer
+    (axes, ticks, grid, legend), which is cached and restored before the
+    lines are drawn and blitted. A full draw happens only when the axis
+    limits or the legend have to change.
+    """
+
+    def __init__(self, figure, canvas, title, xlabel, ylabel, grid_color, xlim=None):
+        self.figure = figure
+        self.canvas = canvas
+        self.ax = figure.add_subplot(111)
+        self.ax.set_title(title)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.grid(True, color=grid_color)
+        self.fixed_xlim = xlim
+        if xlim is not None:
+            self.ax.set_xlim(*xlim)
+
+        self.lines = {}
+        self._styles = {}
+        self._data = {}
+        self._envelopes = {}
+        self._changed = False
+        self._needs_full_draw = True
+        self._background = None
+
+        canvas.mpl_connect('draw_event', self._on_draw)
+        self.ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    def add_series(self, name, label=None, **style):
+        self.lines[name] = []
+        self._styles[name] = (label, style)
+        self._data[name] = None
+
+    def set_series(self, name, x, y):
+        """Replace the data of a series; y=None hides it. Returns True if anything changed"""
+        previous = self._data[name]
+        if y is None:
+            if previous is None:
+                return False
+            for line in self.lines[name]:
+                line.set_visible(False)
+            self._data[name] = None
+            self._changed = self._needs_full_draw = True
+            return True
+
+        rows = np.atleast_2d(y)
+        if (previous is not None and previous[1].shape == rows.shape
+                and np.array_equal(previous[0], x) and np.array_equal(previous[1], rows)):
+            return False
+
+        lines = self.lines[name]
+        label, style = self._styles[name]
+        while len(lines) < len(rows):
+            line, = self.ax.plot([], [], animated=True, **style)
+            if label is not None and not lines:
+                line.set_label(label)
+            lines.append(line)
+            self._needs_full_draw = True
+        while len(lines) > len(rows):
+            lines.pop().remove()
+            self._needs_full_draw = True
+
+        for line, row in zip(lines, rows):
+            line.set_data(x, row)
+            if not line.get_visible():
+                line.set_visible(True)
+                self._needs_full_draw = True
+
+        self._data[name] = (x, rows)
+        self._changed = True
+        return True
+
+    def set_envelope(self, name, pyramid):
+        """Show an EnvelopePyramid as a series, re-queried on every zoom/pan"""
+        if pyramid is None:
+            self._envelopes.pop(name, None)
+            return self.set_series(name, None, None)
+
+        previous = self._envelopes.get(name)
+        self._envelopes[name] = pyramid
+        if previous is None or previous.get_duration() != pyramid.get_duration():
+            # New signal length: reset the view to the whole signal
+            self.ax.set_xlim(0, pyramid.get_duration())
+            self._needs_full_draw = True
+
+        x, y = pyramid.query(*self.ax.get_xlim(), self._get_columns())
+        return self.set_series(name, x, y)
+
+    def _get_columns(self):
+        return max(int(self.ax.bbox.width), 1)
+
+    def _on_xlim_changed(self, ax):
+        for name, pyramid in self._envelopes.items():
+            if self._data[name] is not None:
+                x, y = pyramid.query(*ax.get_xlim(), self._get_columns())
+                self.set_series(name, x, y)
+
+    def _update_limits(self):
+        visible = [data for data in self._data.values() if data is not None]
+        if not visible:
+            return
+
+        if self.fixed_xlim is None and not self._envelopes:
+            xlim = (min(np.min(x) for x, _ in visible), max(np.max(x) for x, _ in visible))
+            if xlim[1] > xlim[0] and tuple(self.ax.get_xlim()) != xlim:
+                self.ax.set_xlim(*xlim)
+                self._needs_full_draw = True
+
+        low = min(np.min(rows) for _, rows in visible)
+        high = max(np.max(rows) for _, rows in visible)
+        span = max(high - low, 1e-9)
+        current_low, current_high = self.ax.get_ylim()
+        # Keep the current limits (and the cached background) while the
+        # data fits and still fills at least half of the axes
+        if low < current_low or high > current_high or span < 0.5 * (current_high - current_low):
+            self.ax.set_ylim(low - 0.05 * span, high + 0.05 * span)
+            self._needs_full_draw = True
+
+    def _draw_lines(self):
+        for lines in self.lines.values():
+            for line in lines:
+                if line.get_visible():
+                    self.ax.draw_artist(line)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_lines()
+
+    def refresh(self):
+        """Redraw if any series changed. Returns True if the canvas was redrawn"""
+        if not self._changed:
+            return False
+        self._changed = False
+
+        self._update_limits()
+        if self._needs_full_draw or self._background is None:
+            self._needs_full_draw = False
+            handles = [lines[0] for lines in self.lines.values()
+                       if lines and lines[0].get_visible() and not lines[0].get_label().startswith('_')]
+            if handles:
+                self.ax.legend(handles=handles)
+            elif self.ax.get_legend() is not None:
+                self.ax.get_legend().remove()
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_lines()
+            self.canvas.blit(self.figure.bbox)
+        return True
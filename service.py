@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from filters import BAND_PRESETS, EqualizerFilter
+from instrumentation import StageStats
+from mixer import SignalMixer
+
+DEFAULT_PORT = 8765
+MAX_EQUALIZERS = 32
+
+
+def parse_config(query):
+    """(bands, sample_rate, gains, disabled) and the channel count from a request query string
+
+    Same conventions as batch.py: linear gains in band order and
+    1-based numbers of the bands to switch off. Raises ValueError.
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    bands = params.get('bands', 'voice')
+    if bands not in BAND_PRESETS:
+        raise ValueError(f"unknown bands '{bands}', expected one of {', '.join(BAND_PRESETS)}")
+    num_bands = len(BAND_PRESETS[bands])
+
+    sample_rate = int(params.get('rate', 0))
+    if sample_rate <= 0:
+        raise ValueError("rate must be a positive sample rate in Hz")
+    channels = int(params.get('channels', 1))
+    if channels <= 0:
+        raise ValueError("channels must be positive")
+
+    if 'gains' in params:
+        gains = tuple(float(gain) for gain in params['gains'].split(','))
+        if len(gains) != num_bands:
+            raise ValueError(f"gains needs {num_bands} values for the '{bands}' bands")
+    else:
+        gains = (1.0,) * num_bands
+    disabled = tuple(sorted({int(band) for band in params['disable'].split(',') if band}
+                            if params.get('disable') else ()))
+    if any(not 1 <= band <= num_bands for band in disabled):
+        raise ValueError(f"disable takes band numbers between 1 and {num_bands}")
+    return (bands, sample_rate, gains, disabled), channels
+
+
+class EqualizerService:
+    """Equalizes PCM buffers on a thread pool, micro-batching requests that share a configuration.
+
+    Requests with the same configuration (bands, rate, gains, disabled
+    bands) collect in one pending batch. A batch goes to the pool as soon
+    as a worker is free (after batch_window seconds, if set) or once it
+    holds max_batch requests; while every worker is busy, batches keep
+    growing and the oldest is dispatched when a worker frees up. So a
+    lone request pays no waiting time and a loaded service runs few,
+    large passes. Buffers of the same shape in a batch are stacked and
+    filtered in one process_bank call; the filters themselves are cached
+    per bands/rate/enables. All state except the equalizer cache lives
+    on the event loop thread.
+    """
+
+    def __init__(self, workers=None, batch_window=0.0, max_batch=32, dtype=np.float64):
+        self.workers = workers or os.cpu_count()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.dtype = np.dtype(dtype)
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._pending = {}
+        self._equalizers = OrderedDict()
+        self._equalizers_lock = threading.Lock()
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.audio_seconds = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.running_batches = 0
+        self.latency = StageStats()
+        self.batch_time = StageStats()
+        self.batch_sizes = Counter()
+
+    async def equalize(self, config, signal):
+        """Equalize one (channels x samples) buffer with config from parse_config"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        start = time.perf_counter()
+
+        batch = self._pending.get(config)
+        if batch is None:
+            batch = self._pending[config] = []
+            if self.running_batches < self.workers:
+                # Even without a window the flush waits for the next loop pass,
+                # so requests read in this one still join the batch
+                loop.call_later(self.batch_window, self._flush, config, batch)
+        batch.append((signal, future))
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        if len(batch) >= self.max_batch:
+            self._flush(config, batch)
+
+        try:
+            result = await future
+        except Exception:
+            self.errors += 1
+            raise
+        else:
+            self.audio_seconds += signal.shape[-1] / config[1]
+            return result
+        finally:
+            self.queue_depth -= 1
+            self.requests += 1
+            self.latency.add(time.perf_counter() - start)
+
+    def _flush(self, config, batch):
+        # A batch already flushed by max_batch or a free worker is gone from _pending
+        if self._pending.get(config) is not batch:
+            return
+        del self._pending[config]
+        self.batches += 1
+        self.batched_requests += len(batch)
+        self.running_batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+        signals = [signal for signal, _ in batch]
+        task = asyncio.get_running_loop().run_in_executor(self._executor, self._process_batch, config, signals)
+        task.add_done_callback(lambda task: self._finish_batch(batch, task))
+
+    def _finish_batch(self, batch, task):
+        self.running_batches -= 1
+        # Batches that grew while every worker was busy, oldest first
+        for config, pending in list(self._pending.items())[:self.workers - self.running_batches]:
+            self._flush(config, pending)
+
+        if task.exception() is not None:
+            results, elapsed = [task.exception()] * len(batch), 0.0
+        else:
+            results, elapsed = task.result()
+        self.batch_time.add(elapsed)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _get_equalizer(self, bands, sample_rate, disabled):
+        # One equalizer per rate and enables, so concurrent batches never
+        # change each other's sample rate or band switches
+        key = (bands, sample_rate, disabled)
+        with self._equalizers_lock:
+            equalizer = self._equalizers.get(key)
+            if equalizer is None:
+                equalizer = EqualizerFilter(BAND_PRESETS[bands], self.dtype)
+                equalizer.set_sample_rate(sample_rate)
+                for band in disabled:
+                    equalizer.set_filter_enabled(band - 1, False)
+                self._equalizers[key] = equalizer
+                if len(self._equalizers) > MAX_EQUALIZERS:
+                    self._equalizers.popitem(last=False)
+            else:
+                self._equalizers.move_to_end(key)
+            return equalizer
+
+    def _process_batch(self, config, signals):
+        """Worker side: one vectorized pass per distinct buffer shape; returns (results, seconds)"""
+        start = time.perf_counter()
+        bands, sample_rate, gains, disabled = config
+        equalizer = self._get_equalizer(bands, sample_rate, disabled)
+        mixer = SignalMixer(len(gains), self.dtype)
+        for i, gain in enumerate(gains):
+            mixer.set_filter_gain(i, gain)
+        weights = mixer.get_mix_weights(equalizer.enabled)
+
+        groups = {}
+        for i, signal in enumerate(signals):
+            groups.setdefault(signal.shape, []).append(i)
+
+        results = [None] * len(signals)
+        for indices in groups.values():
+            try:
+                stacked = np.stack([signals[i] for i in indices])
+                mixed = np.tensordot(weights, equalizer.process_bank(stacked, sample_rate), axes=1)
+            except Exception as e:
+                for i in indices:
+                    results[i] = e
+                continue
+            for row, i in enumerate(indices):
+                results[i] = mixed[row]
+        return results, time.perf_counter() - start
+
+    def get_metrics(self):
+        uptime = time.perf_counter() - self.started
+        return {
+            'uptime_s': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'pending_batches': len(self._pending),
+            'running_batches': self.running_batches,
+            'audio_seconds': self.audio_seconds,
+            'requests_per_s': self.requests / uptime if uptime else 0.0,
+            'audio_seconds_per_s': self.audio_seconds / uptime if uptime else 0.0,
+            'latency_mean_ms': self.latency.get_mean() * 1000,
+            'latency_max_ms': self.latency.max * 1000,
+            'batch_mean_ms': self.batch_time.get_mean() * 1000,
+            'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+    async def _route(self, method, target, body):
+        """(status, content type, payload) for one HTTP request"""
+        url = urlsplit(target)
+        if url.path == '/metrics':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b"use GET"
+            return HTTPStatus.OK, 'application/json', json.dumps(self.get_metrics()).encode()
+        if url.path != '/equalize':
+            return HTTPStatus.NOT_FOUND, 'text/plain', b"unknown path"
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b"use POST"
+
+        try:
+            config, channels = parse_config(url.query)
+            if len(body) % (4 * channels):
+                raise ValueError(f"body must hold interleaved float32 frames of {channels} channels")
+        except ValueError as e:
+            self.rejected += 1
+            return HTTPStatus.BAD_REQUEST, 'text/plain', str(e).encode()
+
+        # Interleaved little-endian float32 frames, as a sound card takes them
+        signal = np.frombuffer(body, '<f4').reshape(-1, channels).T.astype(self.dtype)
+        try:
+            output = await self.equalize(config, signal)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, 'text/plain', str(e).encode()
+        return HTTPStatus.OK, 'application/octet-stream', output.T.astype('<f4').tobytes()
+
+    async def handle_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: enough for the local client and curl"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, content_type, payload = await self._route(method, target, body)
+                except Exception as e:
+                    status, content_type, payload = HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain', str(e).encode()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Malformed request or client gone: just drop the connection
+            pass
+        finally:
+            writer.close()
+
+    async def start_server(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class BackgroundServer:
+    """Runs an EqualizerService on its own event loop thread, e.g. for benchmarks.
+
+    With port=0 the system picks a free port, available as .port once
+    start() returns.
+    """
+
+    def __init__(self, service, host='127.0.0.1', port=0, unix_path=None):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            self.service.start_server(self.host, self.port, self.unix_path))
+        if self.unix_path is None:
+            self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+        self.service.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local equalization service over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", default=None,
+                        help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker threads (default: CPU count)")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="extra wait for requests with the same settings while a worker is idle")
+    parser.add_argument("--max-batch", type=int, default=32,
+                        help="flush a batch as soon as it holds this many requests")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="processing dtype (float32 halves memory and bandwidth)")
+    return parser
+
+
+async def serve(service, host, port, unix_path):
+    server = await service.start_server(host, port, unix_path)
+    where = unix_path or f"http://{host}:{server.sockets[0].getsockname()[1]}"
+    print(f"Equalizer service on {where} (POST /equalize, GET /metrics)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = EqualizerService(args.workers, args.batch_window_ms / 1000, args.max_batch, args.dtype)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import numpy as np
 
 class SignalGenerator:
-    def __init__(self):
+    def __init__(self, dtype=np.float64):
         self.MAX_FREQUENCY = 4000  
         self.DEFAULT_FREQUENCIES = [150, 300, 800]  
         self.DEFAULT_AMPLITUDES = [1.0, 0.7, 0.5]
@@ -10,9 +10,16 @@ class SignalGenerator:
         self.amplitudes = self.DEFAULT_AMPLITUDES.copy()
         self.phases = [0, 0, 0]  
         self.sample_rate = 16000  
+        # Dtype of the generated samples. Phases are always computed in
+        # float64: over minutes of signal float32 would drift by radians
+        self.dtype = np.dtype(dtype)
+        
+        self._time_axis_key = None
+        self._time_axis = None
+        self._block_phases = None
         
     def set_component_parameters(self, component_idx, frequency=None, amplitude=None, phase=None):
-        if 0 <= component_idx < 3:
+        if 0 <= component_idx < len(self.frequencies):
             if frequency is not None:
                 max_freq = min(self.MAX_FREQUENCY, self.sample_rate / 2.0 * 0.95)  
                 self.frequencies[component_idx] = min(float(frequency), max_freq)
@@ -21,24 +28,71 @@ class SignalGenerator:
             if phase is not None:
                 self.phases[component_idx] = phase
     
+    def add_component(self, frequency, amplitude=1.0, phase=0):
+        max_freq = min(self.MAX_FREQUENCY, self.sample_rate / 2.0 * 0.95)
+        self.frequencies.append(min(float(frequency), max_freq))
+        self.amplitudes.append(amplitude)
+        self.phases.append(phase)
+        self._block_phases = None
+    
+    def remove_component(self, component_idx):
+        if 0 <= component_idx < len(self.frequencies):
+            del self.frequencies[component_idx]
+            del self.amplitudes[component_idx]
+            del self.phases[component_idx]
+            self._block_phases = None
+    
+    def get_time_axis(self, duration):
+        key = (duration, self.sample_rate)
+        if key != self._time_axis_key:
+            self._time_axis = np.linspace(0, duration, int(duration * self.sample_rate), endpoint=False)
+            self._time_axis_key = key
+        return self._time_axis
+    
+    def generate_components(self, duration):
+        t = self.get_time_axis(duration)
+        # (components x samples) in one broadcast expression
+        frequencies = np.asarray(self.frequencies, dtype=float)[:, np.newaxis]
+        amplitudes = np.asarray(self.amplitudes, dtype=float)[:, np.newaxis]
+        phases = np.asarray(self.phases, dtype=float)[:, np.newaxis]
+        components = amplitudes * np.sin(2 * np.pi * frequencies * t + phases)
+        return components.astype(self.dtype, copy=False), t
+    
     def generate_component(self, component_idx, duration):
-        if 0 <= component_idx < 3:
-            t = np.linspace(0, duration, int(duration * self.sample_rate), endpoint=False)
-            return self.amplitudes[component_idx] * np.sin(
+        if 0 <= component_idx < len(self.frequencies):
+            t = self.get_time_axis(duration)
+            component = self.amplitudes[component_idx] * np.sin(
                 2 * np.pi * self.frequencies[component_idx] * t + self.phases[component_idx]
-            ), t
-        return np.array([]), np.array([])
+            )
+            return component.astype(self.dtype, copy=False), t
+        return np.array([], dtype=self.dtype), np.array([])
     
     def generate_complete_signal(self, duration):
-        t = np.linspace(0, duration, int(duration * self.sample_rate), endpoint=False)
-        signal = np.zeros_like(t)
+        components, t = self.generate_components(duration)
+        return components.sum(axis=0), t
+    
+    def reset_blocks(self):
+        self._block_phases = np.array(self.phases, dtype=float)
+    
+    def generate_block(self, num_samples):
+        # Running phase per component: blocks join without discontinuities,
+        # even when a frequency changes between blocks
+        if self._block_phases is None or len(self._block_phases) != len(self.frequencies):
+            self.reset_blocks()
         
-        for i in range(3):
-            signal += self.amplitudes[i] * np.sin(
-                2 * np.pi * self.frequencies[i] * t + self.phases[i]
-            )
-            
-        return signal, t
+        steps = 2 * np.pi * np.asarray(self.frequencies, dtype=float) / self.sample_rate
+        phases = self._block_phases[:, np.newaxis] + steps[:, np.newaxis] * np.arange(num_samples)
+        block = np.asarray(self.amplitudes, dtype=float) @ np.sin(phases)
+        
+        self._block_phases = (self._block_phases + steps * num_samples) % (2 * np.pi)
+        return block.astype(self.dtype, copy=False)
+    
+    def iter_blocks(self, block_size, num_blocks=None):
+        self.reset_blocks()
+        count = 0
+        while num_blocks is None or count < num_blocks:
+            yield self.generate_block(block_size)
+            count += 1
     
     def get_sample_rate(self):
         return self.sample_rate
@@ -48,6 +102,6 @@ class SignalGenerator:
             self.sample_rate = rate
             
             nyquist = rate / 2.0
-            for i in range(3):
+            for i in range(len(self.frequencies)):
                 if self.frequencies[i] >= nyquist:
-                    self.frequencies[i] = nyquist * 0.95 
\ No newline at end of file
+                    self.frequencies[i] = nyquist * 0.95 
@@ -0,0 +1,90 @@
+import http.client
+import threading
+
+import numpy as np
+import pytest
+
+from client import EqualizerClient
+from filters import BAND_PRESETS, EqualizerFilter, IIREqualizer
+from mixer import SignalMixer
+from service import BackgroundServer, EqualizerService
+
+SAMPLE_RATE = 16000
+GAINS = [1.0, 0.5, 1.0, 2.0, 1.0]
+DISABLE = [5]
+
+
+@pytest.fixture
+def server():
+    # One worker and a short window, so concurrent requests always share a batch
+    server = BackgroundServer(EqualizerService(workers=1, batch_window=0.05)).start()
+    yield server
+    server.stop()
+
+
+def reference(signal):
+    equalizer = EqualizerFilter(BAND_PRESETS['voice'])
+    mixer = SignalMixer(len(equalizer.band_limits))
+    for i, gain in enumerate(GAINS):
+        mixer.set_filter_gain(i, gain)
+    for band in DISABLE:
+        equalizer.set_filter_enabled(band - 1, False)
+    return IIREqualizer(equalizer, mixer).process(signal.astype(np.float64), SAMPLE_RATE)
+
+
+def test_concurrent_requests_match_iir_and_are_batched(server):
+    rng = np.random.default_rng(0)
+    signals = [rng.standard_normal(4000).astype(np.float32) * 0.1 for _ in range(8)]
+    outputs = [None] * len(signals)
+    barrier = threading.Barrier(len(signals))
+
+    def send(i):
+        with EqualizerClient(port=server.port) as client:
+            barrier.wait()
+            outputs[i] = client.equalize(signals[i], SAMPLE_RATE, gains=GAINS, disable=DISABLE)
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(signals))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for signal, output in zip(signals, outputs):
+        assert output.dtype == np.float32
+        np.testing.assert_allclose(output, reference(signal), atol=1e-6)
+
+    with EqualizerClient(port=server.port) as client:
+        metrics = client.get_metrics()
+    assert metrics['requests'] == len(signals)
+    assert metrics['mean_batch_size'] > 1
+
+
+def test_stereo_request(server):
+    signal = np.random.default_rng(1).standard_normal((2, 3000)).astype(np.float32) * 0.1
+    with EqualizerClient(port=server.port) as client:
+        output = client.equalize(signal, SAMPLE_RATE, gains=GAINS, disable=DISABLE)
+    assert output.shape == signal.shape
+    np.testing.assert_allclose(output, reference(signal), atol=1e-6)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'bands': 'unknown'},
+    {'gains': [1.0, 1.0]},
+    {'disable': [6]},
+    {'sample_rate': 0},
+], ids=['bands', 'gains', 'disable', 'rate'])
+def test_bad_query_is_rejected(server, kwargs):
+    sample_rate = kwargs.pop('sample_rate', SAMPLE_RATE)
+    with EqualizerClient(port=server.port) as client:
+        with pytest.raises(ValueError):
+            client.equalize(np.zeros(100, dtype=np.float32), sample_rate, **kwargs)
+        assert client.get_metrics()['rejected'] == 1
+
+
+def test_bad_body_is_400(server):
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+    connection.request('POST', f'/equalize?rate={SAMPLE_RATE}&channels=2', b'\0' * 12)
+    response = connection.getresponse()
+    assert response.status == 400
+    assert b'channels' in response.read()
+    connection.close()
@@ -0,0 +1,20 @@
+import sys
+
+import pytest
+
+from benchmark import (CORE_IMPORT_BUDGET, FIRST_WINDOW_BUDGET, HEAVY_MODULES, READY_BUDGET,
+                       _display_command, measure_core_import, measure_first_window)
+
+
+def test_core_import_is_light_and_within_budget():
+    core_time, loaded = measure_core_import()
+    assert loaded == [], f"core import pulled in {', '.join(loaded)} (none of {HEAVY_MODULES} allowed)"
+    assert core_time <= CORE_IMPORT_BUDGET
+
+
+def test_first_window_and_ready_within_budget():
+    if _display_command([sys.executable]) is None:
+        pytest.skip("no display available and xvfb-run not found")
+    first_window, ready = measure_first_window()
+    assert first_window <= FIRST_WINDOW_BUDGET
+    assert ready <= READY_BUDGET
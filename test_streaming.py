@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+from filters import BAND_PRESETS, EqualizerFilter, StreamingEqualizer
+
+
+def one_shot(equalizer, input_signal, sample_rate):
+    """Causal reference: every band filtered over the whole input in one sosfilt call"""
+    outputs = []
+    for i in range(len(equalizer.band_limits)):
+        sos = equalizer.design_filter(i, sample_rate)
+        if sos is None:
+            outputs.append(np.zeros_like(input_signal))
+        elif isinstance(sos, np.ndarray):
+            outputs.append(signal.sosfilt(sos, input_signal))
+        else:
+            outputs.append(input_signal)
+    return np.stack(outputs)
+
+
+@pytest.mark.parametrize('bands', list(BAND_PRESETS))
+@pytest.mark.parametrize('shape', [(10007,), (2, 10007)], ids=['mono', 'stereo'])
+@pytest.mark.parametrize('block_size', [7, 333, 1024, 20000])
+def test_blocks_match_one_shot(bands, shape, block_size):
+    sample_rate = 16000
+    equalizer = EqualizerFilter(BAND_PRESETS[bands])
+    input_signal = np.random.default_rng(0).standard_normal(shape)
+
+    streaming = StreamingEqualizer(equalizer, block_size, sample_rate)
+    blocks = np.concatenate(list(streaming.process(input_signal)), axis=-1)
+
+    assert np.array_equal(blocks, one_shot(equalizer, input_signal, sample_rate))
+
+
+def test_reset_restarts_from_rest():
+    equalizer = EqualizerFilter()
+    input_signal = np.random.default_rng(1).standard_normal(5000)
+    streaming = StreamingEqualizer(equalizer, 512, 16000)
+
+    first = np.concatenate(list(streaming.process(input_signal)), axis=-1)
+    streaming.reset()
+    second = np.concatenate(list(streaming.process(input_signal)), axis=-1)
+
+    assert np.array_equal(first, second)
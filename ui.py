@@ -1,38 +1,66 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
-import scipy.io.wavfile as wavfile
-import pyaudio
+import copy
 import threading
 import time
 
+from analyzer import SpectrumAnalyzer, compute_fft
+from audio_output import EqualizedPlayback, PyAudioSink
+from band_cache import BandCache
+from compute_worker import ComputeWorker
+from envelope import EnvelopePyramid
+from instrumentation import Instrumentation
+from filters import (BACKENDS, BAND_PRESETS, IIREqualizer, MultirateEqualizer, ParametricEqualizer,
+                     ToneResponse, create_backend)
+from plotting import BlitPlot
+from signal_generator import SignalGenerator
+from wav_io import WavReader, iter_bank_blocks, read_padded, render_wav
+
 class EqualizerUI:
     COLOR_INPUT_SIGNAL = 'blue'              
     COLOR_INPUT_COMPONENTS = ['#ff7f0e', '#2ca02c', '#d62728']  
     COLOR_OUTPUT_SIGNAL = 'red'              
     COLOR_COMPONENT_ALPHA = 0.5              
     COLOR_GRID = '#cccccc'                   
+    COLOR_LIVE_SPECTRUM = 'purple'
+    PLAYBACK_BLOCK_SIZE = 1024
+    ANALYZER_FPS = 30
+    BANDS_PER_COLUMN = 8
+    DEBUG_REFRESH_MS = 500
     
-    def __init__(self, root, signal_generator, equalizer_filter, signal_mixer):
+    def __init__(self, root, signal_generator, equalizer_filter, signal_mixer, cache_bytes=256 * 2 ** 20,
+                 audio_sink_factory=PyAudioSink):
         self.root = root
-        self.root.title("5-Band Equalizer")
         self.root.geometry("1700x950")  
         
         self.signal_generator = signal_generator
         self.equalizer_filter = equalizer_filter
         self.signal_mixer = signal_mixer
+        self.audio_sink_factory = audio_sink_factory
+        self._display_generator = SignalGenerator(signal_generator.dtype)
+        
+        self.num_bands = len(self.equalizer_filter.band_limits)
+        self.root.title(f"{self.num_bands}-Band Equalizer")
         
         self.filter_vars = []
-        for i in range(5):
+        for i in range(self.num_bands):
             self.filter_vars.append(tk.BooleanVar(value=True))
         
-        for i in range(5):
+        for i in range(self.num_bands):
             self.signal_mixer.set_filter_gain(i, 1.0)
         
         self.duration = 1.0  
+        self.instrumentation = Instrumentation()
+        self.debug_window = None
+        self.band_cache = BandCache(cache_bytes)
+        self.engine_var = tk.StringVar(value='iir')
+        self.equalizer_engine = create_backend('iir', self.equalizer_filter, self.signal_mixer)
+        self.equalizer_engine.instrumentation = self.instrumentation
+        self.equalizer_engine.band_cache = self.band_cache
+        self.tone_response = ToneResponse(self.equalizer_filter)
         
         self.input_time_fig = None
         self.input_freq_fig = None
@@ -45,15 +73,26 @@ class EqualizerUI:
         
         self.is_playing = False
         self.audio_thread = None
-        self.stream = None
-        self.pyaudio_instance = None
+        self.audio_sink = None
+        self.playback = None
         self.current_audio_data = None
+        self._output_envelope = (None, None)
+        self._live_mix_weights = None
+        self.analyzer = None
         self.sample_rate = 44100
         
         self.wav_file_path = None
-        self.wav_data = None
+        self.wav_reader = None
+        self._wav_envelope = (None, None)
         self.use_wav = tk.BooleanVar(value=False)
         
+        self.compute_worker = ComputeWorker(
+            self.root,
+            self._compute_display,
+            self._render_display,
+            self._display_error
+        )
+        
         self._create_layout()
         
         self.update_display()
@@ -152,23 +191,56 @@ class EqualizerUI:
         self.wav_file_label = ttk.Label(wav_frame, text="No hay archivo seleccionado")
         self.wav_file_label.pack(anchor=tk.W, padx=5, pady=5)
         
+        self.export_button = ttk.Button(
+            wav_frame,
+            text="Exportar WAV ecualizado",
+            command=self.export_wav_file,
+            state="disabled"
+        )
+        self.export_button.pack(anchor=tk.W, padx=5, pady=5)
+        
         filter_frame = ttk.LabelFrame(right_controls, text="Equalizer Bands")
         filter_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        filter_labels = ["Banda 1 (80-250 Hz): Voz masculina", 
-                        "Banda 2 (250-500 Hz): Voz femenina", 
-                        "Banda 3 (500-1000 Hz): Primer formante", 
-                        "Banda 4 (1000-2000 Hz): Segundo formante", 
-                        "Banda 5 (2000-4000 Hz): Armónicos altos"]
+        if self.equalizer_filter.band_limits == BAND_PRESETS['voice']:
+            filter_labels = ["Banda 1 (80-250 Hz): Voz masculina", 
+                            "Banda 2 (250-500 Hz): Voz femenina", 
+                            "Banda 3 (500-1000 Hz): Primer formante", 
+                            "Banda 4 (1000-2000 Hz): Segundo formante", 
+                            "Banda 5 (2000-4000 Hz): Armónicos altos"]
+        else:
+            filter_labels = [f"Banda {i+1} ({low:g}-{high:g} Hz)" 
+                             for i, (low, high) in enumerate(self.equalizer_filter.band_limits)]
+        
+        bands_frame = ttk.Frame(filter_frame)
+        bands_frame.pack(fill=tk.X)
         
-        for i in range(5):
+        for i in range(self.num_bands):
             filter_check = ttk.Checkbutton(
-                filter_frame, 
+                bands_frame, 
                 text=filter_labels[i],
                 variable=self.filter_vars[i],
                 command=self.update_filters
             )
-            filter_check.pack(anchor=tk.W, padx=5, pady=5)
+            filter_check.grid(
+                row=i % self.BANDS_PER_COLUMN, 
+                column=i // self.BANDS_PER_COLUMN, 
+                sticky=tk.W, padx=5, pady=5
+            )
+        
+        engine_frame = ttk.Frame(filter_frame)
+        engine_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(engine_frame, text="Motor:").pack(side=tk.LEFT)
+        
+        engine_combo = ttk.Combobox(
+            engine_frame,
+            textvariable=self.engine_var,
+            values=list(BACKENDS),
+            state="readonly",
+            width=10
+        )
+        engine_combo.bind("<<ComboboxSelected>>", lambda event: self.update_engine())
+        engine_combo.pack(side=tk.LEFT, padx=5)
         
         # ------ PLOTS ------
         plots_row = ttk.Frame(plots_frame)
@@ -179,6 +251,8 @@ class EqualizerUI:
         
         self.input_time_fig = Figure(figsize=(4, 4), dpi=100)
         self.input_time_canvas = FigureCanvasTkAgg(self.input_time_fig, master=input_time_frame)
+        self.input_time_toolbar = NavigationToolbar2Tk(self.input_time_canvas, input_time_frame, pack_toolbar=False)
+        self.input_time_toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.input_time_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=3, pady=3)
         
         input_freq_frame = ttk.LabelFrame(plots_row, text="Input Signal - Frequency Domain")
@@ -193,6 +267,8 @@ class EqualizerUI:
         
         self.output_time_fig = Figure(figsize=(4, 4), dpi=100)
         self.output_time_canvas = FigureCanvasTkAgg(self.output_time_fig, master=output_time_frame)
+        self.output_time_toolbar = NavigationToolbar2Tk(self.output_time_canvas, output_time_frame, pack_toolbar=False)
+        self.output_time_toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.output_time_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=3, pady=3)
         
         output_freq_frame = ttk.LabelFrame(plots_row, text="Output Signal - Frequency Domain")
@@ -202,6 +278,41 @@ class EqualizerUI:
         self.output_freq_canvas = FigureCanvasTkAgg(self.output_freq_fig, master=output_freq_frame)
         self.output_freq_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=3, pady=3)
         
+        self.input_time_plot = BlitPlot(
+            self.input_time_fig, self.input_time_canvas,
+            'Input Signal - Time Domain', 'Time (s)', 'Amplitude', self.COLOR_GRID
+        )
+        self.input_freq_plot = BlitPlot(
+            self.input_freq_fig, self.input_freq_canvas,
+            'Input Signal - Frequency Domain', 'Frequency (Hz)', 'Magnitude', self.COLOR_GRID,
+            xlim=(0, 4000)
+        )
+        self.output_time_plot = BlitPlot(
+            self.output_time_fig, self.output_time_canvas,
+            'Output Signal - Time Domain', 'Time (s)', 'Amplitude', self.COLOR_GRID
+        )
+        self.output_freq_plot = BlitPlot(
+            self.output_freq_fig, self.output_freq_canvas,
+            'Output Signal - Frequency Domain', 'Frequency (Hz)', 'Magnitude', self.COLOR_GRID,
+            xlim=(0, 4000)
+        )
+        self.plots = [self.input_time_plot, self.input_freq_plot, self.output_time_plot, self.output_freq_plot]
+        
+        self.input_time_plot.add_series('signal', label='Input Signal', color=self.COLOR_INPUT_SIGNAL)
+        self.input_freq_plot.add_series('signal', color=self.COLOR_INPUT_SIGNAL)
+        for plot in (self.input_time_plot, self.input_freq_plot):
+            for i in range(3):
+                plot.add_series(
+                    f'component{i}', 
+                    label=f'Component {i+1}', 
+                    linestyle='--', 
+                    color=self.COLOR_INPUT_COMPONENTS[i], 
+                    alpha=self.COLOR_COMPONENT_ALPHA
+                )
+        self.output_time_plot.add_series('signal', label='Equalized Signal', color=self.COLOR_OUTPUT_SIGNAL)
+        self.output_freq_plot.add_series('signal', label='Equalized Signal', color=self.COLOR_OUTPUT_SIGNAL)
+        self.output_freq_plot.add_series('live', label='Playback', color=self.COLOR_LIVE_SPECTRUM)
+        
         # ------ PLAYBACK CONTROLS ------
         playback_buttons_frame = ttk.Frame(playback_frame)
         playback_buttons_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -229,17 +340,29 @@ class EqualizerUI:
         )
         self.stop_button.pack(side=tk.LEFT, padx=5)
         
+        debug_button = ttk.Button(
+            playback_buttons_frame,
+            text="Depuración",
+            command=self.open_debug_panel
+        )
+        debug_button.pack(side=tk.RIGHT, padx=5)
+        
         self.status_label = ttk.Label(playback_frame, text="Listo para reproducir")
         self.status_label.pack(anchor=tk.W, padx=5, pady=5)
+        
+        self.redraw_label = ttk.Label(playback_frame, text="")
+        self.redraw_label.pack(anchor=tk.W, padx=5, pady=5)
     
     def toggle_wav_mode(self):
         """Toggle between generated signal and WAV file modes"""
         if self.use_wav.get():
             self.browse_button.config(state="normal")
+            self.export_button.config(state="normal")
             for slider in self.freq_sliders + self.amp_sliders:
                 slider.config(state="disabled")
         else:
             self.browse_button.config(state="disabled")
+            self.export_button.config(state="disabled")
             for slider in self.freq_sliders + self.amp_sliders:
                 slider.config(state="normal")
         
@@ -261,23 +384,45 @@ class EqualizerUI:
     def load_wav_file(self):
         """Load the selected WAV file"""
         try:
-            self.sample_rate, wav_data = wavfile.read(self.wav_file_path)
+            wav_reader = WavReader(self.wav_file_path)
+            wav_reader.scan_peak()
             
-            if len(wav_data.shape) > 1: 
-                wav_data = np.mean(wav_data, axis=1)
-            
-            wav_data = wav_data.astype(np.float32)
-            if np.max(np.abs(wav_data)) > 0:
-                wav_data = wav_data / np.max(np.abs(wav_data))
-            
-            self.wav_data = wav_data
-            self.status_label.config(text=f"Archivo WAV cargado: {self.sample_rate} Hz")
+            self.wav_reader = wav_reader
+            self.sample_rate = wav_reader.sample_rate
+            self.status_label.config(text=f"Archivo WAV cargado: {self.sample_rate} Hz, {wav_reader.channels} canal(es)")
             return True
         except Exception as e:
             self.status_label.config(text=f"Error al cargar archivo WAV: {str(e)}")
-            self.wav_data = None
+            self.wav_reader = None
             return False
     
+    def export_wav_file(self):
+        """Equalize the whole WAV file block by block into a new WAV file"""
+        if self.wav_reader is None:
+            return
+        
+        output_path = filedialog.asksaveasfilename(
+            title="Guardar WAV ecualizado",
+            defaultextension=".wav",
+            filetypes=[("WAV files", "*.wav")]
+        )
+        if not output_path:
+            return
+        
+        self.status_label.config(text="Exportando...")
+        thread = threading.Thread(target=self._export_thread, args=(self.wav_file_path, output_path))
+        thread.daemon = True
+        thread.start()
+    
+    def _export_thread(self, input_path, output_path):
+        """Thread function for WAV export"""
+        try:
+            duration = render_wav(input_path, output_path, self.equalizer_filter, self.signal_mixer)
+            message = f"Exportado: {output_path.split('/')[-1]} ({duration:.1f} s)"
+        except Exception as e:
+            message = f"Error al exportar: {str(e)}"
+        self.root.after(0, lambda: self.status_label.config(text=message))
+    
     def update_freq_value(self, value, index):
         """Update frequency value label when slider is moved"""
         freq_value = float(value)
@@ -303,115 +448,335 @@ class EqualizerUI:
         self.update_display()
     
     def update_filters(self):
-        for i in range(5):
+        for i in range(self.num_bands):
             self.equalizer_filter.set_filter_enabled(i, self.filter_vars[i].get())
         
+        self._publish_mix_weights()
+        self.update_display()
+    
+    def _publish_mix_weights(self):
+        """Hand the current band gains/enables to the playback callback"""
+        self._live_mix_weights = self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled)
+        playback = self.playback
+        if playback is not None:
+            playback.mix_weights = self._live_mix_weights
+    
+    def update_engine(self):
+        """Switch the equalization backend (IIR filter bank or FFT overlap-save)"""
+        self.equalizer_engine = create_backend(
+            self.engine_var.get(),
+            self.equalizer_filter,
+            self.signal_mixer
+        )
+        self.equalizer_engine.instrumentation = self.instrumentation
+        if hasattr(self.equalizer_engine, 'band_cache'):
+            self.equalizer_engine.band_cache = self.band_cache
+        
         self.update_display()
     
     def compute_fft(self, signal, sample_rate):
         """Compute FFT for the given signal"""
-        fft_result = np.fft.rfft(signal)
-        fft_freq = np.fft.rfftfreq(len(signal), 1/sample_rate)
-        fft_magnitude = np.abs(fft_result) / len(signal) * 2  
-        
-        max_freq_idx = np.where(fft_freq <= 4000)[0][-1] + 1
-        return fft_freq[:max_freq_idx], fft_magnitude[:max_freq_idx]
+        return compute_fft(signal, sample_rate)
     
     def update_display(self):
+        """Queue a recompute of the plots from the current parameters"""
         if self.input_time_fig is None:
             return
+        
+        use_wav = self.use_wav.get() and self.wav_reader is not None
+        self.compute_worker.submit({
+            'use_wav': use_wav,
+            'wav_reader': self.wav_reader,
+            'sample_rate': self.sample_rate,
+            'duration': self.duration,
+            'generator_parameters': (
+                list(self.signal_generator.frequencies),
+                list(self.signal_generator.amplitudes),
+                list(self.signal_generator.phases),
+                self.signal_generator.get_sample_rate(),
+            ),
+            'equalizer_engine': self.equalizer_engine,
+            'mix_weights': self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled),
+        })
+    
+    def _compute_display(self, snapshot):
+        """Generate, equalize and transform one parameter snapshot (worker thread)"""
+        with self.instrumentation.stage('compute'):
+            return self._compute_display_stages(snapshot)
+    
+    def _compute_display_stages(self, snapshot):
+        stage = self.instrumentation.stage
+        result = {}
+        
+        if snapshot['use_wav']:
+            wav_reader = snapshot['wav_reader']
+            sample_rate = snapshot['sample_rate']
+            max_samples = min(sample_rate, wav_reader.num_samples)
+            with stage('read'):
+                input_signal = wav_reader.read(0, max_samples)
             
-        if self.use_wav.get() and self.wav_data is not None:
-            max_samples = min(self.sample_rate, len(self.wav_data))
-            input_signal = self.wav_data[:max_samples]
-            time_axis = np.linspace(0, max_samples/self.sample_rate, max_samples)
-            sample_rate = self.sample_rate
+            new_file = self._wav_envelope[0] is not wav_reader
+            with stage('envelope'):
+                result['input_envelope'] = self._get_wav_envelope(wav_reader)
         else:
-            input_signal, time_axis = self.signal_generator.generate_complete_signal(self.duration)
-            sample_rate = self.signal_generator.get_sample_rate()
-        
-        filtered_signals = []
-        for i in range(5):
-            filtered = self.equalizer_filter.apply_filter(
-                input_signal, 
-                i, 
-                sample_rate
-            )
-            filtered_signals.append(filtered)
+            # Worker-owned generator: keeps its cached time axis between snapshots
+            signal_generator = self._display_generator
+            (signal_generator.frequencies, signal_generator.amplitudes,
+             signal_generator.phases, signal_generator.sample_rate) = snapshot['generator_parameters']
+            with stage('generate'):
+                components, _ = signal_generator.generate_components(snapshot['duration'])
+                input_signal = components.sum(axis=0)
+            sample_rate = signal_generator.get_sample_rate()
+            
+            with stage('envelope'):
+                result['input_envelope'] = EnvelopePyramid.from_signal(input_signal, sample_rate)
+                component_envelopes = [EnvelopePyramid.from_signal(component, sample_rate)
+                                       for component in components]
+            with stage('fft'):
+                comp_fft_freq, comp_fft_mag = self.compute_fft(components, sample_rate)
+            result['components'] = [
+                (envelope, comp_fft_freq, magnitude)
+                for envelope, magnitude in zip(component_envelopes, comp_fft_mag)
+            ]
+        
+        with stage('equalize'):
+            if snapshot['use_wav'] or getattr(snapshot['equalizer_engine'], 'causal', False):
+                # A causal engine shifts each tone's phase: filter the samples
+                output_signal = snapshot['equalizer_engine'].process(input_signal, sample_rate)
+            else:
+                # Pure tones: scale each component by the bank response at its
+                # frequency instead of filtering the samples
+                output_signal = self.tone_response.process(
+                    components, signal_generator.frequencies, snapshot['mix_weights'], sample_rate
+                )
+        if not snapshot['use_wav']:
+            with stage('envelope'):
+                result['output_envelope'] = EnvelopePyramid.from_signal(output_signal, sample_rate)
+        
+        result['output_signal'] = output_signal
+        with stage('fft'):
+            result['input_fft'] = self.compute_fft(input_signal, sample_rate)
+            result['output_fft'] = self.compute_fft(output_signal, sample_rate)
+        
+        if snapshot['use_wav']:
+            # Show the input and spectra right away; the previous output
+            # envelope stays up (unless it belongs to another file) until
+            # the full-file pass, which a newer snapshot cancels, is done
+            result['wav_reader'] = wav_reader
+            partial = dict(result)
+            if new_file:
+                partial['output_envelope'] = None
+            self.compute_worker.publish(partial)
+            with stage('render_wav'):
+                result['output_envelope'] = self._render_wav_envelope(
+                    wav_reader, snapshot['mix_weights'], snapshot['equalizer_engine'])
+        return result
+    
+    def _get_wav_envelope(self, wav_reader):
+        """Envelope of the whole WAV file, built once per loaded file"""
+        cached_reader, envelope = self._wav_envelope
+        if cached_reader is not wav_reader:
+            envelope = EnvelopePyramid.for_length(wav_reader.num_samples, wav_reader.sample_rate,
+                                                  read_raw=wav_reader.read)
+            for block in wav_reader.iter_blocks():
+                envelope.append(block)
+            envelope.finish()
+            self._wav_envelope = (wav_reader, envelope)
+        return envelope
+    
+    def _get_wav_renderer(self, wav_reader, mix_weights, equalizer_engine):
+        """(read, padding): read(start, stop) equalizes that range of the WAV like the selected engine
+        
+        Each call gets its own engine, so the Tk thread can equalize a
+        zoomed range while the worker renders the next snapshot.
+        """
+        equalizer = self.equalizer_filter
+        sample_rate = wav_reader.sample_rate
+        causal, alignment = False, 1
+        if isinstance(equalizer_engine, IIREqualizer):
+            padding = equalizer.get_padding(sample_rate)
+            def render(block):
+                return np.tensordot(mix_weights, equalizer.process_bank(block, sample_rate), axes=1)
+        elif isinstance(equalizer_engine, ParametricEqualizer):
+            engine = ParametricEqualizer(equalizer, self.signal_mixer)
+            padding, causal = engine.get_padding(sample_rate, weights=mix_weights), True
+            def render(block):
+                engine.reset()
+                return engine.process_block(block, mix_weights, sample_rate)
+        else:
+            engine = type(equalizer_engine)(equalizer, self.signal_mixer)
+            padding = engine.get_padding(sample_rate)
+            if isinstance(engine, MultirateEqualizer):
+                alignment = engine.get_alignment(sample_rate)
+            def render(block):
+                return engine.process(block, sample_rate)
+        
+        def read(start, stop):
+            return read_padded(wav_reader, render, start, stop, padding, causal, alignment)
+        return read, padding
+    
+    def _render_wav_envelope(self, wav_reader, mix_weights, equalizer_engine):
+        """Envelope of the whole WAV file equalized by the selected engine
+        
+        The file is rendered block by block and the pass is abandoned as
+        soon as a newer snapshot is queued. Level 0 is coarsened for long
+        files; zooming in further equalizes just the visible samples.
+        """
+        read, padding = self._get_wav_renderer(wav_reader, mix_weights, equalizer_engine)
+        envelope = EnvelopePyramid.for_length(wav_reader.num_samples, wav_reader.sample_rate, read_raw=read)
+        check_cancelled = self.compute_worker.check_cancelled
+        
+        if isinstance(equalizer_engine, IIREqualizer):
+            self._render_wav_bank(wav_reader, mix_weights, envelope)
+        elif isinstance(equalizer_engine, ParametricEqualizer):
+            # Causal: stream the whole file through the biquads from rest
+            parametric = ParametricEqualizer(self.equalizer_filter, self.signal_mixer)
+            for block in wav_reader.iter_blocks():
+                check_cancelled()
+                envelope.append(parametric.process_block(block, mix_weights, wav_reader.sample_rate))
+        else:
+            block_size = max(wav_reader.block_size, 4 * padding)
+            for start in range(0, wav_reader.num_samples, block_size):
+                check_cancelled()
+                envelope.append(read(start, min(start + block_size, wav_reader.num_samples)))
+        envelope.finish()
+        return envelope
+    
+    def _render_wav_bank(self, wav_reader, mix_weights, envelope):
+        """Feed the zero-phase bank output of the whole file to envelope
+        
+        When the band outputs of the whole file fit in the band cache they
+        are kept there, and later gain/enable changes only remix them.
+        """
+        equalizer = self.equalizer_filter
+        check_cancelled = self.compute_worker.check_cancelled
+        file_key = ('bank', wav_reader.get_fingerprint(), equalizer.filter_order,
+                    wav_reader.sample_rate, equalizer.dtype.str)
+        band_keys = [file_key + (limits,) for limits in equalizer.band_limits]
+        block_size = wav_reader.block_size
+        
+        active = [i for i in range(self.num_bands) if mix_weights[i] != 0]
+        bands = {i: self.band_cache.get(band_keys[i]) for i in active}
+        if all(band is not None for band in bands.values()):
+            for start in range(0, wav_reader.num_samples, block_size):
+                check_cancelled()
+                mixed = np.zeros((wav_reader.channels, min(block_size, wav_reader.num_samples - start)),
+                                 dtype=equalizer.dtype)
+                for i, band in bands.items():
+                    mixed += mix_weights[i] * band[:, start:start + block_size]
+                envelope.append(mixed)
+            return
         
-        output_signal = self.signal_mixer.mix_signals(
-            filtered_signals,
-            [self.filter_vars[i].get() for i in range(5)]
-        )
+        band_shape = (wav_reader.channels, wav_reader.num_samples)
+        band_bytes = np.prod(band_shape) * equalizer.dtype.itemsize
+        store = self.band_cache.fits(band_bytes * self.num_bands)
+        bank_filter = equalizer
+        if store:
+            bands = [np.empty(band_shape, dtype=equalizer.dtype) for _ in range(self.num_bands)]
+            # process_bank writes zeros for disabled bands: filter every band,
+            # so switching one back on finds its real output in the cache
+            bank_filter = copy.copy(equalizer)
+            bank_filter.enabled = [True] * self.num_bands
+        
+        for start, filtered_signals in iter_bank_blocks(wav_reader, bank_filter):
+            check_cancelled()
+            if store:
+                for band, filtered in zip(bands, filtered_signals):
+                    band[:, start:start + filtered.shape[-1]] = filtered
+            envelope.append(np.tensordot(mix_weights, filtered_signals, axes=1))
+        
+        if store:
+            for key, band in zip(band_keys, bands):
+                self.band_cache.put(key, band)
+    
+    def _render_display(self, result):
+        """Push a computed result into the plots (Tk thread)"""
+        self.current_audio_data = result['output_signal']
+        
+        self.input_time_plot.set_envelope('signal', result['input_envelope'])
+        self.input_freq_plot.set_series('signal', *result['input_fft'])
+        
+        for i in range(3):
+            if 'components' in result:
+                component_envelope, comp_fft_freq, comp_fft_mag = result['components'][i]
+                self.input_time_plot.set_envelope(f'component{i}', component_envelope)
+                self.input_freq_plot.set_series(f'component{i}', comp_fft_freq, comp_fft_mag)
+            else:
+                self.input_time_plot.set_envelope(f'component{i}', None)
+                self.input_freq_plot.set_series(f'component{i}', None, None)
+        
+        if 'output_envelope' in result:
+            self._output_envelope = (result.get('wav_reader'), result['output_envelope'])
+            self.output_time_plot.set_envelope('signal', result['output_envelope'])
+        self.output_freq_plot.set_series('signal', *result['output_fft'])
+        
+        draw_start = time.perf_counter()
+        redrawn = sum(plot.refresh() for plot in self.plots)
+        draw_time = (time.perf_counter() - draw_start) * 1000
+        self.instrumentation.record('draw', draw_time / 1000)
+        self.redraw_label.config(text=f"Redibujado: {draw_time:.1f} ms ({redrawn}/{len(self.plots)} gráficas)")
+    
+    def open_debug_panel(self):
+        """Show stage timings and audio callback statistics in a separate window"""
+        if self.debug_window is not None:
+            self.debug_window.lift()
+            return
         
-        self.current_audio_data = output_signal
+        self.debug_window = tk.Toplevel(self.root)
+        self.debug_window.title("Depuración - Instrumentación")
+        self.debug_window.protocol("WM_DELETE_WINDOW", self._close_debug_panel)
         
-        input_fft_freq, input_fft_mag = self.compute_fft(input_signal, sample_rate)
-        output_fft_freq, output_fft_mag = self.compute_fft(output_signal, sample_rate)
+        controls = ttk.Frame(self.debug_window)
+        controls.pack(fill=tk.X, padx=5, pady=5)
         
-        self.input_time_fig.clear()
-        ax_input_time = self.input_time_fig.add_subplot(111)
-        ax_input_time.plot(time_axis, input_signal, color=self.COLOR_INPUT_SIGNAL, label='Input Signal')
+        self.instrumentation_var = tk.BooleanVar(value=self.instrumentation.enabled)
+        ttk.Checkbutton(
+            controls,
+            text="Instrumentación activa",
+            variable=self.instrumentation_var,
+            command=lambda: self.instrumentation.set_enabled(self.instrumentation_var.get())
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Reiniciar", command=self.instrumentation.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Exportar CSV", command=self.export_debug_csv).pack(side=tk.LEFT, padx=5)
         
-        if not self.use_wav.get():
-            for i in range(3):
-                component, _ = self.signal_generator.generate_component(i, self.duration)
-                ax_input_time.plot(time_axis, component, '--', 
-                                color=self.COLOR_INPUT_COMPONENTS[i], 
-                                alpha=self.COLOR_COMPONENT_ALPHA, 
-                                label=f'Component {i+1}')
-        
-        ax_input_time.set_xlabel('Time (s)')
-        ax_input_time.set_ylabel('Amplitude')
-        ax_input_time.set_title('Input Signal - Time Domain')
-        ax_input_time.legend()
-        ax_input_time.grid(True, color=self.COLOR_GRID)
-        
-        self.input_freq_fig.clear()
-        ax_input_freq = self.input_freq_fig.add_subplot(111)
-        ax_input_freq.plot(input_fft_freq, input_fft_mag, color=self.COLOR_INPUT_SIGNAL)
-        
-        if not self.use_wav.get():
-            for i in range(3):
-                component, _ = self.signal_generator.generate_component(i, self.duration)
-                comp_fft_freq, comp_fft_mag = self.compute_fft(component, sample_rate)
-                ax_input_freq.plot(comp_fft_freq, comp_fft_mag, '--', 
-                                color=self.COLOR_INPUT_COMPONENTS[i], 
-                                alpha=self.COLOR_COMPONENT_ALPHA, 
-                                label=f'Component {i+1}')
-        
-        ax_input_freq.set_xlabel('Frequency (Hz)')
-        ax_input_freq.set_ylabel('Magnitude')
-        ax_input_freq.set_title('Input Signal - Frequency Domain')
-        ax_input_freq.set_xlim(0, 4000)  
-        ax_input_freq.legend()
-        ax_input_freq.grid(True, color=self.COLOR_GRID)
-        
-        self.output_time_fig.clear()
-        ax_output_time = self.output_time_fig.add_subplot(111)
-        ax_output_time.plot(time_axis, output_signal, color=self.COLOR_OUTPUT_SIGNAL, label='Equalized Signal')
-        
-        ax_output_time.set_xlabel('Time (s)')
-        ax_output_time.set_ylabel('Amplitude')
-        ax_output_time.set_title('Output Signal - Time Domain')
-        ax_output_time.legend()
-        ax_output_time.grid(True, color=self.COLOR_GRID)
-        
-        self.output_freq_fig.clear()
-        ax_output_freq = self.output_freq_fig.add_subplot(111)
-        ax_output_freq.plot(output_fft_freq, output_fft_mag, color=self.COLOR_OUTPUT_SIGNAL, label='Equalized Signal')
-        
-        ax_output_freq.set_xlabel('Frequency (Hz)')
-        ax_output_freq.set_ylabel('Magnitude')
-        ax_output_freq.set_title('Output Signal - Frequency Domain')
-        ax_output_freq.set_xlim(0, 4000)  
-        ax_output_freq.legend()
-        ax_output_freq.grid(True, color=self.COLOR_GRID)
-        
-        self.input_time_canvas.draw()
-        self.input_freq_canvas.draw()
-        self.output_time_canvas.draw()
-        self.output_freq_canvas.draw()
+        self.debug_text = tk.Text(self.debug_window, width=60, height=40, font=("Courier", 9))
+        self.debug_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self._refresh_debug_panel()
+    
+    def _close_debug_panel(self):
+        self.debug_window.destroy()
+        self.debug_window = None
+    
+    def _refresh_debug_panel(self):
+        if self.debug_window is None:
+            return
+        
+        report = self.instrumentation.format_report()
+        report += (f"\n\nsnapshots descartados: {self.compute_worker.dropped}, "
+                   f"cancelados: {self.compute_worker.cancelled}")
+        stats = self.band_cache.get_stats()
+        report += (f"\ncaché de bandas: {stats['hits']} aciertos, {stats['misses']} fallos "
+                   f"({stats['hit_rate']:.0%}), {stats['entries']} entradas, "
+                   f"{stats['bytes'] / 2 ** 20:.1f}/{stats['max_bytes'] / 2 ** 20:.0f} MB, "
+                   f"{stats['evictions']} desalojos")
+        self.debug_text.delete("1.0", tk.END)
+        self.debug_text.insert(tk.END, report)
+        
+        self.root.after(self.DEBUG_REFRESH_MS, self._refresh_debug_panel)
+    
+    def export_debug_csv(self):
+        """Save the collected instrumentation to a CSV file"""
+        file_path = filedialog.asksaveasfilename(
+            title="Exportar instrumentación",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv")]
+        )
+        if file_path:
+            self.instrumentation.export_csv(file_path)
+    
+    def _display_error(self, error):
+        self.status_label.config(text=f"Error al calcular: {str(error)}")
     
     def play_audio(self):
         """Play the equalized audio"""
@@ -428,6 +793,21 @@ class EqualizerUI:
         self.audio_thread.daemon = True
         self.audio_thread.start()
         
+        self.root.after(1000 // self.ANALYZER_FPS, self._update_analyzer)
+    
+    def _update_analyzer(self):
+        """Draw the live playback spectrum at a fixed frame rate"""
+        if not self.is_playing:
+            self.output_freq_plot.set_series('live', None, None)
+            self.output_freq_plot.refresh()
+            return
+        
+        if self.analyzer is not None:
+            self.output_freq_plot.set_series('live', *self.analyzer.get_spectrum())
+            self.output_freq_plot.refresh()
+        
+        self.root.after(1000 // self.ANALYZER_FPS, self._update_analyzer)
+        
     def pause_audio(self):
         """Pause the audio playback"""
         if not self.is_playing:
@@ -446,65 +826,67 @@ class EqualizerUI:
         self.pause_button.config(state="disabled")
         self.stop_button.config(state="disabled")
         
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
-            self.stream = None
-        
-        if self.pyaudio_instance:
-            self.pyaudio_instance.terminate()
-            self.pyaudio_instance = None
+        if self.audio_sink is not None:
+            self.audio_sink.stop()
+            self.audio_sink = None
+        self.playback = None
     
     def _audio_playback_thread(self):
         """Thread function for audio playback"""
         try:
-            self.pyaudio_instance = pyaudio.PyAudio()
-            
-            if self.use_wav.get() and self.wav_data is not None:
+            if self.use_wav.get() and self.wav_reader is not None:
                 sample_rate = self.sample_rate
+                wav_reader = self.wav_reader
+                num_samples = wav_reader.num_samples
+                channels = wav_reader.channels
+                
+                def read_block(pos, frame_count):
+                    return np.atleast_2d(wav_reader.read(pos, pos + frame_count))
             else:
                 sample_rate = self.signal_generator.get_sample_rate()
-            
-            audio_data = self.current_audio_data.copy()
-            if np.max(np.abs(audio_data)) > 0:
-                audio_data = audio_data / np.max(np.abs(audio_data)) * 0.9
-            
-            audio_data = audio_data.astype(np.float32)
-            
-            def audio_callback(in_data, frame_count, time_info, status):
-                if not self.is_playing:
-                    return (np.zeros(frame_count, dtype=np.float32), pyaudio.paComplete)
+                num_samples = int(self.duration * sample_rate)
+                channels = 1
+                self.signal_generator.reset_blocks()
                 
-                if hasattr(self, 'playback_position'):
-                    pos = self.playback_position
+                # Phase-continuous blocks that follow the sliders while playing
+                def read_block(pos, frame_count):
+                    frame_count = min(frame_count, num_samples - pos)
+                    return self.signal_generator.generate_block(frame_count)[np.newaxis]
+            
+            # Level from the displayed equalized output, as before; later
+            # band changes are heard as level changes and clipped if needed
+            if self.use_wav.get() and self.wav_reader is not None:
+                # The preview signal is only the first second: use the
+                # full-file render, or if it is not ready, the bound from the
+                # input (normalized to a peak of 1) and the loudest band
+                rendered_reader, envelope = self._output_envelope
+                if envelope is not None and rendered_reader is wav_reader:
+                    peak = envelope.get_peak()
                 else:
-                    pos = 0
-                    self.playback_position = 0
-                
-                if pos >= len(audio_data):
-                    self.root.after(100, self.stop_audio)
-                    return (np.zeros(frame_count, dtype=np.float32), pyaudio.paComplete)
-                
-                chunk = audio_data[pos:min(pos+frame_count, len(audio_data))]
-                self.playback_position += len(chunk)
-                
-                if len(chunk) < frame_count:
-                    chunk = np.pad(chunk, (0, frame_count - len(chunk)), 'constant')
-                
-                return (chunk, pyaudio.paContinue)
+                    peak = np.max(np.abs(self.signal_mixer.get_mix_weights(self.equalizer_filter.enabled)))
+            else:
+                peak = np.max(np.abs(self.current_audio_data))
+            level = 0.9 / peak if peak > 0 else 0.0
             
-            self.stream = self.pyaudio_instance.open(
-                format=pyaudio.paFloat32,
-                channels=1,
-                rate=int(sample_rate),
-                output=True,
-                stream_callback=audio_callback
-            )
+            block_size = self.PLAYBACK_BLOCK_SIZE
+            analyzer = SpectrumAnalyzer(sample_rate, channels)
+            self.analyzer = analyzer
+            self._publish_mix_weights()
+            self.instrumentation.end_callbacks()
             
-            self.playback_position = 0
-            self.stream.start_stream()
+            self.playback = EqualizedPlayback(
+                self.equalizer_filter, read_block, num_samples, sample_rate, channels, level,
+                self._live_mix_weights, block_size, analyzer, self.instrumentation,
+                is_running=lambda: self.is_playing,
+                on_finished=lambda: self.root.after(100, self.stop_audio),
+                parametric=(ParametricEqualizer(self.equalizer_filter, self.signal_mixer)
+                            if isinstance(self.equalizer_engine, ParametricEqualizer) else None)
+            )
+            sink = self.audio_sink_factory()
+            self.audio_sink = sink
+            sink.start(self.playback, sample_rate, channels, block_size)
             
-            while self.stream.is_active() and self.is_playing:
+            while sink.is_active() and self.is_playing:
                 time.sleep(0.1)
             
             if self.is_playing:
@@ -517,6 +899,7 @@ class EqualizerUI:
     def run(self):
         """Run the UI main loop"""
         self.root.mainloop()
+        self.compute_worker.stop()
         
     def __del__(self):
         """Cleanup resources on destroy"""
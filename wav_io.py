@@ -0,0 +1,179 @@
+import os
+import threading
+import wave
+
+import numpy as np
+
+
+class _PcmFrames:
+    """(samples x channels) integer frames of a PCM WAV sliced through the wave module.
+    
+    Stands in for scipy's memory map where numpy cannot map the samples
+    (24-bit containers): only the requested frames are read and decoded.
+    24-bit samples come out left-justified in int32, as wavfile.read
+    returns them.
+    """
+    
+    _DTYPES = {1: np.uint8, 2: '<i2', 4: '<i4'}
+    
+    def __init__(self, path):
+        self._file = wave.open(path, 'rb')
+        self._lock = threading.Lock()
+        self.sample_rate = self._file.getframerate()
+        self.channels = self._file.getnchannels()
+        self.sample_width = self._file.getsampwidth()
+        num_frames = self._file.getnframes()
+        self.shape = (num_frames, self.channels) if self.channels > 1 else (num_frames,)
+        self.ndim = len(self.shape)
+    
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(self.shape[0])
+        # Playback and the display worker read concurrently
+        with self._lock:
+            self._file.setpos(start)
+            data = self._file.readframes(max(stop - start, 0))
+        
+        if self.sample_width == 3:
+            raw = np.frombuffer(data, np.uint8).reshape(-1, 3)
+            padded = np.zeros((len(raw), 4), np.uint8)
+            padded[:, 1:] = raw
+            frames = padded.view('<i4')[:, 0]
+        else:
+            frames = np.frombuffer(data, self._DTYPES[self.sample_width])
+        frames = frames.reshape(-1, self.channels)
+        return frames if self.channels > 1 else frames[:, 0]
+
+
+class WavReader:
+    """Memory-mapped WAV source read in (channels x samples) float blocks.
+
+    Nothing but the block being read is ever copied into RAM. Peak
+    normalization uses a single streaming pass (scan_peak) instead of
+    loading the whole file.
+    """
+    
+    def __init__(self, path, block_size=65536):
+        self.path = path
+        self.block_size = block_size
+        from scipy.io import wavfile
+        try:
+            self.sample_rate, self._data = wavfile.read(path, mmap=True)
+        except ValueError:
+            # Sample sizes numpy cannot map (24-bit): decode the requested
+            # frames on demand, or load the file if wave cannot parse it
+            try:
+                self._data = _PcmFrames(path)
+                self.sample_rate = self._data.sample_rate
+            except wave.Error:
+                self.sample_rate, self._data = wavfile.read(path)
+        self.num_samples = self._data.shape[0]
+        self.channels = self._data.shape[1] if self._data.ndim > 1 else 1
+        self.peak = None
+    
+    def get_duration(self):
+        return self.num_samples / self.sample_rate
+    
+    def get_fingerprint(self):
+        """Identity of the normalized samples, without reading them"""
+        stat = os.stat(self.path)
+        return (os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns, self.peak)
+    
+    def scan_peak(self):
+        peak = 0.0
+        for start in range(0, self.num_samples, self.block_size):
+            frames = self._data[start:start + self.block_size]
+            peak = max(peak, float(np.max(np.abs(frames.astype(np.float32)))))
+        self.peak = peak
+        return peak
+    
+    def read(self, start, stop, normalize=True):
+        frames = self._data[start:stop].astype(np.float32)
+        if normalize:
+            if self.peak is None:
+                self.scan_peak()
+            if self.peak > 0:
+                frames /= self.peak
+        # (samples x channels) on disk -> (channels x samples)
+        return frames.T
+    
+    def iter_blocks(self, block_size=None, normalize=True):
+        if block_size is None:
+            block_size = self.block_size
+        for start in range(0, self.num_samples, block_size):
+            yield self.read(start, start + block_size, normalize)
+
+
+class WavWriter:
+    """Block-by-block 16-bit PCM WAV writer for float signals in [-1, 1]."""
+    
+    def __init__(self, path, sample_rate, channels=1):
+        self.channels = channels
+        self._file = wave.open(path, 'wb')
+        self._file.setnchannels(channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(int(sample_rate))
+    
+    def write(self, block):
+        frames = np.clip(np.atleast_2d(block).T, -1.0, 1.0)
+        self._file.writeframes((frames * 32767).astype('<i2').tobytes())
+    
+    def close(self):
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_padded(reader, process, start, stop, padding, causal=False, alignment=1):
+    """process() of samples [start, stop) of reader, run with padding samples of context
+    
+    The context is read before the range, and after it too unless the
+    processing is causal, then trimmed off, so a block comes out as it
+    would from processing the whole file. The padded read starts at a
+    multiple of alignment, for processing that decimates.
+    """
+    padded_start = max(0, start - padding) // alignment * alignment
+    padded_stop = stop if causal else min(reader.num_samples, stop + padding)
+    output = process(reader.read(padded_start, padded_stop))
+    return output[..., start - padded_start:stop - padded_start]
+
+
+def iter_bank_blocks(reader, equalizer_filter, block_size=None, tolerance=1e-9):
+    """Yield (start, bands x channels x samples) zero-phase band outputs of a whole file, block by block
+    
+    Each block is read with get_padding samples of context on both
+    sides and run through process_bank, so the start-up transients of
+    both filtfilt passes die out before the kept part, as in the
+    segment-parallel process_bank: the result matches filtering the
+    whole file in one pass to about tolerance times the peak, while
+    memory stays bounded by the block plus its padding.
+    """
+    if block_size is None:
+        block_size = reader.block_size
+    padding = equalizer_filter.get_padding(reader.sample_rate, tolerance)
+    # Blocks much shorter than the padding would mostly filter overlap
+    block_size = max(block_size, 4 * padding)
+    process = lambda block: equalizer_filter.process_bank(block, reader.sample_rate)
+    
+    for start in range(0, reader.num_samples, block_size):
+        stop = min(start + block_size, reader.num_samples)
+        yield start, read_padded(reader, process, start, stop, padding)
+
+
+def render_wav(input_path, output_path, equalizer_filter, signal_mixer, block_size=65536):
+    """Equalize a WAV file block by block with the same zero-phase result as the app's preview"""
+    # The input stays memory-mapped while the output is written: truncating
+    # it in place would crash the process on the next read (SIGBUS)
+    if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+        raise ValueError(f"Output file is the input file: {output_path}")
+    reader = WavReader(input_path, block_size)
+    reader.scan_peak()
+    
+    with WavWriter(output_path, reader.sample_rate, reader.channels) as writer:
+        for _, filtered_signals in iter_bank_blocks(reader, equalizer_filter):
+            writer.write(signal_mixer.mix_signals(filtered_signals, equalizer_filter.enabled))
+    
+    return reader.get_duration()